@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Parse many logs at once, one process per core, e.g. an export of a support channel:
+# python batch.py logs/ export.zip old.tar.gz 2024-01-01-1.log.gz https://paste.ee/p/abc --urls links.txt > results.jsonl
+# One JSON line per log is written as soon as it is parsed, the totals go to stderr.
+
+import argparse
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import logparsing
+from budget import cpu_budget
+from decompress import COMPRESSED_EXTENSIONS as DECOMPRESSED
+from logbuffer import CHUNK_SIZE, LogBuffer, MappedLog
+
+LOG_EXTENSIONS = ('.log', '.txt')
+# single compressed logs, like the ones Minecraft keeps in logs/; .zst only with zstandard
+COMPRESSED_EXTENSIONS = tuple(extension for extension in DECOMPRESSED if extension != '.zip')
+COMPRESSED_LOGS = tuple(log + extension for extension in COMPRESSED_EXTENSIONS for log in LOG_EXTENSIONS)
+# CPU seconds per log; local files aren't cut down to a head and tail like the bot's downloads
+BUDGET = 60
+FACTS = ('launcher', 'operating_system', 'modloader', 'minecraft_version', 'java_version', 'fabric_loader_version')
+
+def decode(data):
+    return data.decode('utf-8', 'replace').replace('\r', '')
+
+def is_archive(path):
+    return path.endswith(('.zip', '.tar.gz', '.tgz', '.tar'))
+
+def find_jobs(sources, url_lists=()):
+    # (source name, kind, payload) for every log; files and zip members are read by the
+    # worker so only their names cross the process boundary
+    for source in sources:
+        if source.startswith(('http://', 'https://')):
+            yield source, 'url', source
+        elif os.path.isdir(source):
+            for root, directories, files in os.walk(source):
+                directories.sort()
+                for name in sorted(files):
+                    path = os.path.join(root, name)
+                    if is_archive(path):
+                        yield from find_jobs([path])
+                    elif name.endswith(LOG_EXTENSIONS):
+                        yield path, 'file', path
+                    elif name.endswith(COMPRESSED_LOGS):
+                        yield path, 'compressed', path
+        elif source.endswith('.zip'):
+            with zipfile.ZipFile(source) as archive:
+                for member in archive.infolist():
+                    if not member.is_dir() and member.filename.endswith(LOG_EXTENSIONS):
+                        yield f'{source}:{member.filename}', 'zip', (source, member.filename)
+        elif is_archive(source):
+            # tar members can only be read in order, so they are read here
+            with tarfile.open(source) as archive:
+                for member in archive:
+                    if member.isfile() and member.name.endswith(LOG_EXTENSIONS):
+                        yield f'{source}:{member.name}', 'text', archive.extractfile(member).read()
+        elif source.endswith(COMPRESSED_EXTENSIONS):
+            yield source, 'compressed', source
+        else:
+            yield source, 'file', source
+    for url_list in url_lists:
+        with (sys.stdin if url_list == '-' else open(url_list)) as file:
+            for line in file:
+                if line.strip() and not line.startswith('#'):
+                    yield line.strip(), 'url', line.strip()
+
+def read_job(kind, payload):
+    # the log and its size in bytes as stored, so a compressed log reports what it would uncompressed
+    if kind == 'url':
+        log = logparsing.download_from_valid_links(payload)
+        return log, len(log or '')
+    if kind == 'compressed':
+        # decompressed a chunk at a time, and all of it kept like an uncompressed local file
+        buffer = LogBuffer(sys.maxsize, 0, sys.maxsize, max_log_size=sys.maxsize)
+        with open(payload, 'rb') as file:
+            while (chunk := file.read(CHUNK_SIZE)) and buffer.feed(chunk):
+                pass
+        log = buffer.text()
+        return log, buffer.received if buffer.decoder is None else buffer.decoder.size
+    if kind == 'zip':
+        with zipfile.ZipFile(payload[0]) as archive:
+            payload = archive.read(payload[1])
+    return decode(payload), len(payload)
+
+def analyse(job, budget=BUDGET):
+    source, kind, payload = job
+    start = time.perf_counter()
+    try:
+        with cpu_budget(budget):
+            fired = []
+            if kind == 'file':
+                # mapped, so big files are never read whole; open until the detectors are done
+                with MappedLog(payload) as log:
+                    context = logparsing.get_mapped_context(log)
+                    size = len(log)
+                    issues = logparsing.rules.evaluate(context, fired=fired)
+            else:
+                log, size = read_job(kind, payload)
+                if log is None:
+                    return {'source': source, 'error': 'not a log link or download failed'}
+                context = logparsing.get_context(log)
+                issues = logparsing.rules.evaluate(context, fired=fired)
+    except Exception as error:
+        return {'source': source, 'error': f'{type(error).__name__}: {error}'}
+    result = {'source': source, 'bytes': size}
+    result.update((fact, context[fact]) for fact in FACTS)
+    result['detectors'] = fired
+    result['issues'] = issues
+    result['seconds'] = round(time.perf_counter() - start, 6)
+    return result
+
+def run(jobs, workers=None, backlog=4, budget=BUDGET):
+    # yields results as they finish; at most `backlog` jobs per worker are queued so archives
+    # read up front don't all sit in memory at once
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for job in jobs:
+            pending.add(executor.submit(analyse, job, budget))
+            if len(pending) >= workers * backlog:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in wait(pending).done:
+            yield future.result()
+
+class Summary:
+    def __init__(self):
+        self.logs = 0
+        self.errors = 0
+        self.bytes = 0
+        self.detectors = Counter()
+        self.facts = {fact: Counter() for fact in ('operating_system', 'launcher', 'modloader', 'minecraft_version')}
+
+    def add(self, result):
+        self.logs += 1
+        if 'error' in result:
+            self.errors += 1
+            return
+        self.bytes += result['bytes']
+        self.detectors.update(result['detectors'])
+        for fact, counter in self.facts.items():
+            counter[result[fact] or 'unknown'] += 1
+
+    def format(self, seconds, top=10):
+        lines = [f'{self.logs} logs ({self.errors} failed), {self.bytes / 1024 / 1024:.1f} MB in {seconds:.1f}s '
+                 f'({self.logs / seconds if seconds else 0:.1f} logs/s)']
+        lines.append('most frequent issues:')
+        lines += [f'  {count:6}  {name}' for name, count in self.detectors.most_common(top)]
+        for fact, counter in self.facts.items():
+            lines.append(f'{fact}: ' + ', '.join(f'{value} {count}' for value, count in counter.most_common(top)))
+        return '\n'.join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description='Parse logs from files, directories, .zip/.tar.gz archives and links.')
+    parser.add_argument('sources', nargs='*', help='files, directories, archives or links')
+    parser.add_argument('--urls', action='append', default=[], help='file with one link per line, - for stdin')
+    parser.add_argument('--workers', type=int, help='parsing processes, defaults to the number of cores')
+    parser.add_argument('--output', help='write the JSON lines here instead of stdout')
+    parser.add_argument('--budget', type=float, default=BUDGET, help='CPU seconds per log before it is cut off, 0 for none')
+    parser.add_argument('--top', type=int, default=10, help='how many issues and values to show in the totals')
+    args = parser.parse_args()
+    if not args.sources and not args.urls:
+        parser.error('nothing to parse')
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    summary = Summary()
+    start = time.perf_counter()
+    try:
+        for result in run(find_jobs(args.sources, args.urls), args.workers, budget=args.budget):
+            output.write(json.dumps(result, ensure_ascii=False) + '\n')
+            output.flush()
+            summary.add(result)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(summary.format(time.perf_counter() - start, args.top), file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
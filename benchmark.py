@@ -0,0 +1,735 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Offline benchmarks for logparsing.py, no network needed.
+# python benchmark.py synthetic --sizes 1,10,50 --baseline HEAD~1
+# python benchmark.py synthetic --sizes 10,50 --spam 0.9 --baseline HEAD~1
+# python benchmark.py startup
+# python benchmark.py resume --size 20 --grown 0.2
+# python benchmark.py mapped --sizes 10,100
+# python benchmark.py chat --messages 100000
+# python benchmark.py gateway --processes 1,2,4 --messages 400 --logs 50
+# python benchmark.py progressive --sizes 1,10,50 --bandwidth 2
+# python benchmark.py generate corpus/
+# python benchmark.py corpus corpus/ --output results.json --compare previous.json
+# python benchmark.py mods --sizes 30,1000,10000,100000
+# The checks that pass or fail are in tests/: python -m pytest tests
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+import logparsing
+import moddb
+import prefilter
+from compact import compact
+from logbuffer import CHUNK_SIZE, LogBuffer
+
+HEADER = '''MultiMC version: 0.7.0-2159
+
+Minecraft folder is:
+C:/MultiMC/instances/1.16.1/.minecraft
+
+
+Java path is:
+C:/Program Files/Java/jdk-17/bin/javaw.exe
+
+
+Checking Java version...
+Java is version 17.0.6, using 64 (amd64) architecture, from Oracle Corporation.
+
+
+Main Class:
+  net.fabricmc.loader.impl.launch.knot.KnotClient
+
+Native path:
+  C:/MultiMC/instances/1.16.1/natives
+
+Traits:
+  XR:Initial
+  FirstThreadOnMacOS
+
+Libraries:
+  C:/MultiMC/libraries/net/fabricmc/fabric-loader/0.14.21/fabric-loader-0.14.21.jar
+  C:/MultiMC/libraries/org/lwjgl/lwjgl/3.2.2/lwjgl-3.2.2.jar
+
+Native libraries:
+  C:/MultiMC/libraries/org/lwjgl/lwjgl/3.2.2/lwjgl-3.2.2-natives-windows.jar
+
+Mods:
+  [✔️] SpeedRunIGT-13.3+1.16.1.jar
+  [✔️] atum-1.1.6+1.16.1.jar
+  [✔️] lazystronghold-1.1.2+1.16.1.jar
+  [✔️] sodium-1.16.1-v3.jar
+  [✔️] worldpreview-3.4.1+1.16.1.jar
+
+Params:
+  --username Player --version 1.16.1 --gameDir C:/MultiMC/instances/1.16.1/.minecraft --assetsDir C:/MultiMC/assets --assetIndex 1.16 --uuid <UUID> --accessToken <ACCESS TOKEN> --userType msa
+
+Window size: 854 x 480
+
+Java Arguments:
+[-XX:HeapDumpPath=MojangTricksIntelDriversForPerformance_javaw.exe_minecraft.exe.heapdump, -Xms512m, -Xmx2048m, -Duser.language=en]
+
+'''
+
+PRISM_HEADER = '''Prism Launcher version: 7.1 (official)
+
+Minecraft folder is:
+/home/player/.local/share/PrismLauncher/instances/1.16.1/.minecraft
+
+
+Java path is:
+/usr/lib/jvm/java-17-openjdk/bin/java
+
+
+Checking Java version...
+Java is version 17.0.7, using 64 (amd64) architecture, from Eclipse Adoptium.
+
+
+Main Class:
+  net.fabricmc.loader.impl.launch.knot.KnotClient
+
+Libraries:
+  /home/player/.local/share/PrismLauncher/libraries/net/fabricmc/fabric-loader/0.14.21/fabric-loader-0.14.21.jar
+
+Native libraries:
+
+Mods:
+  [✔] SpeedRunIGT-13.3+1.16.1
+  [✔] atum-1.1.6+1.16.1
+  [✔] sodium-1.16.1-v3
+  [✔] worldpreview-3.4.1+1.16.1
+
+Params:
+  --username Player --version 1.16.1 --gameDir /home/player/.local/share/PrismLauncher/instances/1.16.1/.minecraft --userType msa
+
+Window size: 854 x 480
+
+Java Arguments:
+[-Xms512m, -Xmx3000m, -XX:+UseShenandoahGC]
+
+'''
+
+HS_ERR_HEADER = '''#
+# A fatal error has been detected by the Java Runtime Environment:
+#
+#  EXCEPTION_ACCESS_VIOLATION (0xc0000005) at pc=0x00007ffb1c2d4a10, pid=12345, tid=6789
+#
+# JRE version: OpenJDK Runtime Environment Temurin-17.0.6+10 (17.0.6+10) (build 17.0.6+10)
+# Java VM: OpenJDK 64-Bit Server VM Temurin-17.0.6+10 (17.0.6+10, mixed mode, tiered, compressed oops, compressed class ptrs, g1 gc, windows-amd64)
+# Problematic frame:
+# C  [ig9icd64.dll+0x1d4a10]
+#
+
+---------------  S U M M A R Y ------------
+
+Command Line: -Xmx2048m net.fabricmc.loader.impl.launch.knot.KnotClient
+
+---------------  T H R E A D  ---------------
+
+'''
+
+CRASH_REPORT_HEADER = '''---- Minecraft Crash Report ----
+// Who set us up the TNT?
+
+Time: 6/18/23 4:20 PM
+Description: Ticking entity
+
+java.lang.NullPointerException: Ticking entity
+	at net.minecraft.class_1297.method_5773(class_1297.java:123)
+
+'''
+
+HEADERS = {
+    'multimc': HEADER,
+    'prism': PRISM_HEADER,
+    'hs_err': HS_ERR_HEADER,
+    'crash_report': CRASH_REPORT_HEADER,
+}
+
+FILLER = [
+    '[12:34:56] [Render thread/INFO]: Loaded 7 advancements',
+    '[12:34:56] [Server thread/INFO]: Saving chunks for level \'ServerLevel[New World]\'/minecraft:overworld',
+    '[12:34:56] [Render thread/WARN]: Unable to play empty soundEvent: minecraft:entity.fish.swim',
+    '[12:34:56] [Worker-Main-4/INFO]: Preparing spawn area: 83%',
+    '[12:34:56] [Render thread/ERROR]: Error executing task on Client',
+    'java.lang.IllegalStateException: Rendersystem called from wrong thread',
+    '\tat net.minecraft.client.MinecraftClient.method_1523(MinecraftClient.java:1036)',
+    '\tat net.minecraft.client.MinecraftClient.run(MinecraftClient.java:681)',
+    '\tat net.minecraft.client.main.Main.main(Main.java:215)',
+    '\tat net.fabricmc.loader.impl.game.minecraft.MinecraftGameProvider.launch(MinecraftGameProvider.java:461)',
+    '\tat java.base/java.lang.Thread.run(Thread.java:833)',
+]
+
+# what logs repeat over and over, with the time they were logged at
+SPAM = [
+    '[{time}] [Render thread/WARN]: Unable to play empty soundEvent: minecraft:entity.fish.swim',
+    '[{time}] [Render thread/WARN]: Using missing texture, unable to load minecraft:textures/block/stone.png',
+    '[{time}] [Server thread/WARN]: Can\'t keep up! Is the server overloaded? Running 2044ms or 40 ticks behind',
+    '[{time}] [Render thread/ERROR]: Error executing task on Client\n' + '\n'.join(FILLER[5:]),
+]
+
+def generate_log(size, seed=0, kind='multimc', spam=0):
+    # size in bytes; a header of the given kind followed by game log lines and stack traces.
+    # About `spam` of the lines are the same warning or trace again, a tick later.
+    rng = random.Random(seed)
+    lines = [HEADERS[kind]]
+    length = len(HEADERS[kind])
+    block = rng.choice(SPAM)
+    tick = 0
+    while length < size:
+        if spam and rng.random() < spam:
+            if rng.random() < 0.01:
+                block = rng.choice(SPAM)
+            line = block.replace('{time}', f'12:{tick // 1200 % 60:02}:{tick // 20 % 60:02}')
+            tick += 1
+        else:
+            line = rng.choice(FILLER)
+        lines.append(line)
+        length += len(line) + 1
+    lines.append('Process crashed with exitcode -1073741819 (0xffffffffc0000005).')
+    return '\n'.join(lines) + '\n'
+
+def best_time(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def load_revision(revision):
+    # logparsing.py as it was at an older git revision, for before/after numbers
+    source = subprocess.check_output(['git', 'show', f'{revision}:logparsing.py'], text=True)
+    module = types.ModuleType(f'logparsing_{revision}')
+    exec(compile(source, f'{revision}:logparsing.py', 'exec'), module.__dict__)
+    return module
+
+def parse_with(module, log):
+    if hasattr(module, 'parse_text'):
+        return module.parse_text(log)
+    module.download_from_valid_links = lambda link: log
+    return module.parse_log('')
+
+def phase_time(log, phase, repeat=3):
+    # fastest time parse_text spent in one phase
+    best = None
+    for _ in range(repeat):
+        timings = {}
+        logparsing.parse_text(log, timings)
+        if best is None or timings.get(phase, 0) < best:
+            best = timings.get(phase, 0)
+    return best
+
+def independent_scans(log):
+    return [needle for needle in logparsing.rules.signatures if needle in log]
+
+def add_timings(total, timings):
+    for name, seconds in timings.items():
+        total[name] = total.get(name, 0) + seconds
+
+def find_logs(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for name in sorted(files):
+                    if name.endswith(('.log', '.txt')):
+                        yield os.path.join(root, name)
+        else:
+            yield path
+
+def read_header(path):
+    # what LogBuffer.header() gives the bot for this log while it downloads, '' for none
+    buffer = LogBuffer()
+    with open(path, 'rb') as file:
+        while chunk := file.read(CHUNK_SIZE):
+            buffer.feed(chunk)
+            header = buffer.header()
+            if header is not None:
+                return header
+    return ''
+
+def run_corpus(paths, repeat=1, memory=False):
+    phases = {}
+    detectors = {}
+    files = []
+    for path in find_logs(paths):
+        best, best_timings = None, None
+        for _ in range(repeat):
+            timings = {}
+            start = time.perf_counter()
+            issues = logparsing.parse_file(path, timings)
+            elapsed = time.perf_counter() - start
+            if best is None or elapsed < best:
+                best, best_timings = elapsed, timings
+        add_timings(phases, {name: best_timings.pop(name, 0) for name in ('compact', 'scan', 'facts')})
+        add_timings(detectors, best_timings)
+        entry = {'path': path, 'bytes': os.path.getsize(path), 'seconds': best, 'issues': len(issues)}
+        # parsing the header for the first answer, sent while the rest of the log downloads
+        header = read_header(path)
+        if header:
+            entry['first_answer_seconds'] = best_time(logparsing.parse_header, header, repeat=repeat)
+        if memory:
+            # separate run, tracemalloc slows parsing down too much to time it at the same time
+            tracemalloc.start()
+            logparsing.parse_file(path)
+            entry['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        files.append(entry)
+    total_bytes = sum(entry['bytes'] for entry in files)
+    total_seconds = sum(entry['seconds'] for entry in files)
+    first_answers = [entry['first_answer_seconds'] for entry in files if 'first_answer_seconds' in entry]
+    return {
+        'logs': len(files),
+        'bytes': total_bytes,
+        'seconds': total_seconds,
+        'mb_per_second': total_bytes / 1024 / 1024 / total_seconds if total_seconds else 0,
+        'logs_per_second': len(files) / total_seconds if total_seconds else 0,
+        'first_answer_seconds': sum(first_answers),
+        'first_answers': len(first_answers),
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'phases': phases,
+        'detectors': dict(sorted(detectors.items(), key=lambda item: -item[1])),
+        'files': files,
+    }
+
+def compare_reports(report, previous, tolerance, min_seconds=0.001):
+    # names of everything that got more than `tolerance` slower than in `previous`
+    regressions = []
+    if report['mb_per_second'] < previous['mb_per_second'] * (1 - tolerance):
+        regressions.append(f"throughput {previous['mb_per_second']:.2f} -> {report['mb_per_second']:.2f} MB/s")
+    old_seconds = previous.get('first_answer_seconds')
+    if old_seconds and report['first_answer_seconds'] > max(min_seconds, old_seconds * (1 + tolerance)):
+        regressions.append(f"first answer {old_seconds*1000:.2f} -> {report['first_answer_seconds']*1000:.2f} ms")
+    for group in ('phases', 'detectors'):
+        for name, seconds in report[group].items():
+            old_seconds = previous[group].get(name)
+            if old_seconds is not None and seconds > min_seconds and seconds > old_seconds * (1 + tolerance):
+                regressions.append(f'{name} {old_seconds*1000:.2f} -> {seconds*1000:.2f} ms')
+    return regressions
+
+def generate(directory, sizes, kinds, spam=0):
+    os.makedirs(directory, exist_ok=True)
+    for kind in kinds:
+        for size in sizes:
+            path = os.path.join(directory, f'{kind}-{size}kb{f"-spam{spam:g}" if spam else ""}.log')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(generate_log(int(size * 1024), kind=kind, spam=spam))
+            print(path)
+
+def synthetic(args):
+    baseline = load_revision(args.baseline) if args.baseline else None
+    for kind, size in [(kind, float(size)) for kind in args.kinds.split(',') for size in args.sizes.split(',')]:
+        log = generate_log(int(size * 1024 * 1024), kind=kind, spam=args.spam)
+        row = {
+            'kind': kind,
+            'size_mb': size,
+            'spam': args.spam,
+            # what's left of the log for the detectors after repeated lines are dropped
+            'compacted_percent': len(compact(log)[0]) / len(log) * 100,
+            'compact_ms': phase_time(log, 'compact', repeat=args.repeat) * 1000,
+            'independent_scans_ms': best_time(independent_scans, log, repeat=args.repeat) * 1000,
+            'signature_scan_ms': best_time(logparsing.rules.scan, log, repeat=args.repeat) * 1000,
+            'parse_log_ms': best_time(parse_with, logparsing, log, repeat=args.repeat) * 1000,
+            # facts are only read when a detector needs them, compared with reading all of them
+            'lazy_facts_ms': phase_time(log, 'facts', repeat=args.repeat) * 1000,
+            'eager_facts_ms': best_time(logparsing.get_log_facts, log, repeat=args.repeat) * 1000,
+        }
+        if baseline:
+            row['baseline_parse_log_ms'] = best_time(parse_with, baseline, log, repeat=args.repeat) * 1000
+        print('  '.join(f'{key}={value:.2f}' if isinstance(value, float) else f'{key}={value}' for key, value in row.items()))
+
+FIRST_MESSAGE = """
+import time
+start = time.perf_counter()
+import logparsing
+import prefilter
+imported = time.perf_counter()
+from benchmark import generate_log
+log = generate_log(100 * 1024)
+generated = time.perf_counter()
+logparsing.parse_text(log)
+first = time.perf_counter()
+logparsing.parse_text(log)
+print(imported - start, first - generated, time.perf_counter() - first)
+"""
+
+def import_times(module):
+    # {module: cumulative microseconds} for `module` and everything it imports, from a
+    # fresh interpreter's -X importtime (which prints a module after its own imports)
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True).stderr
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or not line.split('|')[1].strip().isdigit():
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+        # a top level import that isn't `module` was done by the interpreter itself
+        if not name.startswith('  ') and name.strip() != module:
+            times = {}
+        elif name.strip() == module:
+            return times
+    return times
+
+def startup(args):
+    for module in args.modules.split(','):
+        times = import_times(module)
+        slowest = sorted(((name, value) for name, value in times.items() if name != module), key=lambda item: -item[1])
+        print(f'module={module}  import_ms={times[module] / 1000:.2f}  slowest=' +
+              ','.join(f'{name}:{value / 1000:.1f}' for name, value in slowest[:args.top]))
+    # a new process parsing its first log, like the bot right after it started
+    output = subprocess.run([sys.executable, '-c', FIRST_MESSAGE], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    imported, first, second = (float(value) * 1000 for value in output.split())
+    print(f'import_logparsing_ms={imported:.2f}  first_parse_ms={first:.2f}  second_parse_ms={second:.2f}')
+
+def resume(args):
+    # a log posted again after it grew by `--grown` MB
+    log = generate_log(int(args.size * 1024 * 1024), seed=1)
+    grown = log + generate_log(int(args.grown * 1024 * 1024), seed=2).split('\n', 1)[1]
+    _, state = logparsing.parse_resumable(log)
+    row = {
+        'size_mb': args.size,
+        'grown_mb': args.grown,
+        'parse_text_ms': best_time(logparsing.parse_text, grown, repeat=args.repeat) * 1000,
+        'parse_resumable_first_ms': best_time(logparsing.parse_resumable, grown, repeat=args.repeat) * 1000,
+        'parse_resumable_resumed_ms': best_time(logparsing.parse_resumable, grown, state, repeat=args.repeat) * 1000,
+    }
+    print('  '.join(f'{key}={value:.2f}' for key, value in row.items()))
+
+async def gateway_worker_loop(cache_path, jobs, results, parse_workers):
+    from cache import ResultCache
+    from pipeline import LogPipeline
+    # the paste site rate limits would be all that's measured
+    pipeline = LogPipeline(parse_workers=parse_workers, cache=ResultCache(path=cache_path), resume_size=0,
+                           host_limits={'127.0.0.1': (10000, 10000)})
+    await pipeline.start()
+    results.put(None) # ready
+    loop = asyncio.get_running_loop()
+    answers = []
+    while True:
+        link = await loop.run_in_executor(None, jobs.get)
+        if link is None:
+            break
+        answers.append(asyncio.create_task(pipeline.analyse(link)))
+    answers = await asyncio.gather(*answers, return_exceptions=True)
+    await pipeline.close()
+    results.put((len(answers), sum(isinstance(answer, Exception) for answer in answers), pipeline.stats()))
+
+def gateway_worker(cache_path, jobs, results, parse_workers):
+    asyncio.run(gateway_worker_loop(cache_path, jobs, results, parse_workers))
+
+async def run_gateway(processes, messages, logs, size, parse_workers, seed=0):
+    # Messages with links to `logs` different logs, from random guilds, sent to the process
+    # that has the guild's shard, like shards.py. The logs are served from localhost, which
+    # counts how often each one is downloaded.
+    from aiohttp import web
+    from shards import shard_for
+    texts = [generate_log(size, seed=index) for index in range(logs)]
+    downloads = []
+    async def handle(request):
+        downloads.append(request.match_info['index'])
+        return web.Response(text=texts[int(request.match_info['index'])])
+    app = web.Application()
+    app.router.add_get('/logs/{index}.log', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = os.path.join(directory, 'cache.sqlite3')
+        queues = [context.Queue() for _ in range(processes)]
+        workers = [context.Process(target=gateway_worker, args=(cache_path, queue, results, parse_workers)) for queue in queues]
+        for worker in workers:
+            worker.start()
+        loop = asyncio.get_running_loop()
+        for _ in workers:
+            await loop.run_in_executor(None, results.get)
+        random_ = random.Random(seed)
+        start = time.perf_counter()
+        for _ in range(messages):
+            guild_id = random_.getrandbits(63)
+            queues[shard_for(guild_id, processes)].put(f'http://127.0.0.1:{port}/logs/{random_.randrange(logs)}.log')
+        for queue in queues:
+            queue.put(None)
+        finished = [await loop.run_in_executor(None, results.get) for _ in workers]
+        seconds = time.perf_counter() - start
+        for worker in workers:
+            worker.join()
+    await runner.cleanup()
+    return {
+        'processes': processes,
+        'messages': sum(answered for answered, _, _ in finished),
+        'errors': sum(errors for _, errors, _ in finished),
+        'downloads': len(downloads),
+        'distinct_logs': len(set(downloads)),
+        'parses': sum(stats['parses'] for _, _, stats in finished),
+        'shared_results': sum(stats['shared_results'] for _, _, stats in finished),
+        'seconds': seconds,
+        'messages_per_second': messages / seconds,
+    }
+
+def gateway(args):
+    for processes in [int(processes) for processes in args.processes.split(',')]:
+        row = asyncio.run(run_gateway(processes, args.messages, args.logs, int(args.size * 1024 * 1024), args.parse_workers))
+        print('  '.join(f'{key}={value:.2f}' if isinstance(value, float) else f'{key}={value}' for key, value in row.items()))
+
+async def run_progressive(size, bandwidth, seed=0):
+    # One log streamed from localhost at `bandwidth` bytes per second, like a big upload from
+    # a slow paste site, through a LogPipeline: seconds until the header findings and until
+    # the full result
+    from aiohttp import web
+    from pipeline import LogPipeline
+    data = generate_log(size, seed=seed).encode('utf-8')
+    async def handle(request):
+        response = web.StreamResponse()
+        response.content_length = len(data)
+        await response.prepare(request)
+        for start in range(0, len(data), CHUNK_SIZE):
+            await response.write(data[start:start + CHUNK_SIZE])
+            await asyncio.sleep(CHUNK_SIZE / bandwidth)
+        return response
+    app = web.Application()
+    app.router.add_get('/log.log', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    pipeline = LogPipeline(parse_workers=1, resume_size=0, download_timeout=600, host_limits={'127.0.0.1': (10000, 10000)})
+    await pipeline.start()
+    # the pool's process is started before the clock, like in the running bot
+    await asyncio.get_running_loop().run_in_executor(pipeline.executor, logparsing.parse_header, '')
+    loop = asyncio.get_running_loop()
+    preview = loop.create_future()
+    start = time.perf_counter()
+    future = await pipeline.submit(f'http://127.0.0.1:{port}/log.log', preview)
+    await asyncio.wait([preview, future], return_when=asyncio.FIRST_COMPLETED)
+    first = time.perf_counter() - start
+    result = await future
+    seconds = time.perf_counter() - start
+    await pipeline.close()
+    await runner.cleanup()
+    return {
+        'size_mb': size / 1024 / 1024,
+        'first_answer_ms': first * 1000,
+        'full_answer_ms': seconds * 1000,
+        'header_issues': len(preview.result()) if preview.done() else 0,
+        'issues': len(result or ()),
+    }
+
+def progressive(args):
+    for size in [float(size) for size in args.sizes.split(',')]:
+        row = asyncio.run(run_progressive(int(size * 1024 * 1024), args.bandwidth * 1024 * 1024))
+        print('  '.join(f'{key}={value:.2f}' if isinstance(value, float) else f'{key}={value}' for key, value in row.items()))
+
+CHAT = [
+    'anyone know why my game crashes on world join',
+    'gg that was a sub 15 run',
+    'you need to update sodium, the old version breaks with the new loader and you should also '
+    'check whether your java arguments still have the 4G from the old guide in them ' * 3,
+    'check out https://www.twitch.tv/somebody https://tenor.com/view/pingu-noot-12345.gif',
+    'lol',
+]
+
+READ_FILE = """
+import resource, sys, time
+import logparsing
+start = time.perf_counter()
+if sys.argv[2] == 'mapped':
+    logparsing.parse_file(sys.argv[1])
+else:
+    with open(sys.argv[1], encoding='utf-8', errors='replace', newline='') as file:
+        logparsing.parse_text(file.read().replace('\\r', ''))
+try:
+    # ru_maxrss can include what the parent used before exec
+    with open('/proc/self/status') as status:
+        peak = int(status.read().split('VmHWM:')[1].split()[0])
+except OSError:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(time.perf_counter() - start, peak)
+"""
+
+def mapped(args):
+    # peak RSS of a new process parsing one local file, reading it whole or through MappedLog
+    directory = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as temporary:
+        for size in [float(size) for size in args.sizes.split(',')]:
+            path = os.path.join(temporary, 'latest.log')
+            with open(path, 'w', encoding='utf-8', newline='') as file:
+                file.write(generate_log(int(size * 1024 * 1024), kind=args.kind).replace('\n', '\r\n'))
+            row = {'size_mb': size}
+            for method in ('read', 'mapped'):
+                output = subprocess.run([sys.executable, '-c', READ_FILE, path, method], capture_output=True,
+                                        text=True, check=True, cwd=directory).stdout
+                seconds, rss = output.split()
+                row[f'{method}_ms'] = float(seconds) * 1000
+                row[f'{method}_peak_rss_mb'] = int(rss) / 1024
+            print('  '.join(f'{key}={value:.2f}' if isinstance(value, float) else f'{key}={value}' for key, value in row.items()))
+
+def mod_lookup(args):
+    # looking up logs' mods in mods.json grown to each size with made up mods: building the
+    # database, opening it in a new process, and a lookup per log without and with the cache
+    with open(moddb.SOURCE_PATH, encoding='utf-8') as file:
+        known = json.load(file)
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as temporary:
+        for size in [int(size) for size in args.sizes.split(',')]:
+            mods = dict(known)
+            for index in range(size - len(known)):
+                mods[f'mod{index}'] = {'ranked_whitelist': index % 2 == 0, 'versions': [{'below': '1.5', 'issue': 'old'}]}
+            source = os.path.join(temporary, f'mods{size}.json')
+            with open(source, 'w', encoding='utf-8') as file:
+                json.dump(mods, file)
+            ids = list(mods)
+            logs = [[logparsing.parse_mod_filename(f'{rng.choice(ids)}-1.{rng.randint(0, 9)}.jar') for _ in range(args.per_log)]
+                    for _ in range(args.logs)]
+            path = os.path.splitext(source)[0] + '.db'
+            row = {'mods': size}
+            for name in ('build', 'open'):
+                start = time.perf_counter()
+                database = moddb.ModDatabase(source, path)
+                database.lookup(logs[0])
+                row[f'{name}_ms'] = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            for log in logs:
+                database.cache.clear()
+                database.lookup(log)
+            row['uncached_us_per_log'] = (time.perf_counter() - start) / len(logs) * 1e6
+            for log in logs:
+                database.lookup(log)
+            start = time.perf_counter()
+            for log in logs:
+                database.lookup(log)
+            row['cached_us_per_log'] = (time.perf_counter() - start) / len(logs) * 1e6
+            print('  '.join(f'{key}={value:.2f}' if isinstance(value, float) else f'{key}={value}' for key, value in row.items()))
+
+def chat_stream(count, seed=0):
+    # mostly chat and pictures, like a support channel; a few logs as links and uploads
+    random_ = random.Random(seed)
+    channels = [types.SimpleNamespace(id=index, parent_id=None) for index in range(10)]
+    def attachment(filename, content_type, size):
+        return types.SimpleNamespace(filename=filename, content_type=content_type, size=size,
+                                     url=f'https://cdn.discordapp.com/attachments/1/2/{filename}?ex=1&is=2&hm=3&')
+    for index in range(count):
+        roll = random_.random()
+        attachments = []
+        content = random_.choice(CHAT)
+        if roll < 0.15:
+            attachments = [attachment('image.png', 'image/png', 800*1024)]
+        elif roll < 0.17:
+            attachments = [attachment('clip.mp4', 'video/mp4', 20*1024*1024)]
+        elif roll < 0.19:
+            content = f'here is my log https://paste.ee/p/{index:x}'
+        elif roll < 0.2:
+            attachments = [attachment('latest.log', 'text/plain; charset=utf-8', 300*1024)]
+        yield types.SimpleNamespace(content=content, attachments=attachments, channel=random_.choice(channels))
+
+def unfiltered_links(message):
+    # what on_message did before prefilter: the regex on everything, every attachment
+    return prefilter.LINK_PATTERN.findall(message.content) + [attachment.url for attachment in message.attachments]
+
+def chat(args):
+    messages = list(chat_stream(args.messages))
+    channels = range(args.channels) if args.channels else ()
+    for name, links in [('unfiltered', unfiltered_links), ('prefilter', prefilter.MessageFilter(channels).links)]:
+        seconds = best_time(lambda: [links(message) for message in messages], repeat=args.repeat)
+        # handed to the pipeline, which queues each one for a worker
+        submitted = sum(len(links(message)) for message in messages)
+        print(f'{name}:  messages_per_second={len(messages) / seconds:.0f}  submitted={submitted}')
+
+def corpus(args):
+    report = run_corpus(args.paths, args.repeat, args.memory)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare_reports(report, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f'regression: {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+    synthetic_parser = commands.add_parser('synthetic', help='time generated logs of the given sizes')
+    synthetic_parser.add_argument('--sizes', default='0.01,1,10,50', help='log sizes in MB, comma separated')
+    synthetic_parser.add_argument('--baseline', help='git revision to compare parse_log against')
+    synthetic_parser.add_argument('--repeat', type=int, default=3)
+    synthetic_parser.add_argument('--kinds', default='multimc', help='comma separated, any of ' + ', '.join(HEADERS))
+    synthetic_parser.add_argument('--spam', type=float, default=0, help='share of lines that repeat the one before, 0 to 1')
+    synthetic_parser.set_defaults(func=synthetic)
+    startup_parser = commands.add_parser('startup', help='import times and the first parse in a new process')
+    startup_parser.add_argument('--modules', default='logparsing,pipeline', help='comma separated')
+    startup_parser.add_argument('--top', type=int, default=5, help='how many of the slowest imports to show')
+    startup_parser.set_defaults(func=startup)
+    resume_parser = commands.add_parser('resume', help='time parsing a grown log with and without its ResumeState')
+    resume_parser.add_argument('--size', type=float, default=20, help='MB')
+    resume_parser.add_argument('--grown', type=float, default=0.2, help='MB appended')
+    resume_parser.add_argument('--repeat', type=int, default=3)
+    resume_parser.set_defaults(func=resume)
+    mapped_parser = commands.add_parser('mapped', help='peak memory parsing a local file, read whole or mapped')
+    mapped_parser.add_argument('--sizes', default='1,10,100', help='log sizes in MB, comma separated')
+    mapped_parser.add_argument('--kind', default='multimc', help='any of ' + ', '.join(HEADERS))
+    mapped_parser.set_defaults(func=mapped)
+    chat_parser = commands.add_parser('chat', help='messages per second through the on_message link filter')
+    chat_parser.add_argument('--messages', type=int, default=100000)
+    chat_parser.add_argument('--channels', type=int, default=0, help='only allow this many of the 10 channels')
+    chat_parser.add_argument('--repeat', type=int, default=3)
+    chat_parser.set_defaults(func=chat)
+    gateway_parser = commands.add_parser('gateway', help='sharded bot processes sharing a cache, fed by a fake gateway')
+    gateway_parser.add_argument('--processes', default='1,2,4', help='process counts to compare, comma separated')
+    gateway_parser.add_argument('--messages', type=int, default=400)
+    gateway_parser.add_argument('--logs', type=int, default=50, help='different logs the messages link to')
+    gateway_parser.add_argument('--size', type=float, default=1, help='MB per log')
+    gateway_parser.add_argument('--parse-workers', type=int, default=1, help='parse processes per bot process')
+    gateway_parser.set_defaults(func=gateway)
+    progressive_parser = commands.add_parser('progressive', help='time to the header findings and to the full result of a streamed log')
+    progressive_parser.add_argument('--sizes', default='1,10,50', help='log sizes in MB, comma separated')
+    progressive_parser.add_argument('--bandwidth', type=float, default=2, help='MB per second the log is served at')
+    progressive_parser.set_defaults(func=progressive)
+    generate_parser = commands.add_parser('generate', help='write a synthetic corpus to a directory')
+    generate_parser.add_argument('directory')
+    generate_parser.add_argument('--sizes', default='1,100,1024,10240,51200', help='log sizes in KB, comma separated')
+    generate_parser.add_argument('--kinds', default=','.join(HEADERS), help='comma separated, any of ' + ', '.join(HEADERS))
+    generate_parser.add_argument('--spam', type=float, default=0, help='share of lines that repeat the one before, 0 to 1')
+    generate_parser.set_defaults(func=lambda args: generate(args.directory, [float(size) for size in args.sizes.split(',')], args.kinds.split(','), args.spam))
+    mods_parser = commands.add_parser('mods', help="looking up a log's mods as mods.json grows")
+    mods_parser.add_argument('--sizes', default='30,1000,10000,100000', help='mods in mods.json, comma separated')
+    mods_parser.add_argument('--logs', type=int, default=1000)
+    mods_parser.add_argument('--per-log', type=int, default=40, help='mods in each log')
+    mods_parser.set_defaults(func=mod_lookup)
+    corpus_parser = commands.add_parser('corpus', help='parse every .log/.txt file and report timings as JSON')
+    corpus_parser.add_argument('paths', nargs='+')
+    corpus_parser.add_argument('--repeat', type=int, default=1)
+    corpus_parser.add_argument('--memory', action='store_true', help='also measure peak memory per log')
+    corpus_parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    corpus_parser.add_argument('--compare', help='earlier JSON report; exit with 1 on regressions')
+    corpus_parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown, 0.2 = 20%%')
+    corpus_parser.set_defaults(func=corpus)
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == '__main__':
+    main()
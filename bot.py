@@ -1,50 +1,180 @@
-import os
-import re
-import discord
-from discord.ext import commands
-from dotenv import load_dotenv
-from logparsing import parse_log
-
-load_dotenv()
-bot_token = os.getenv('bot_token')
-
-bot = commands.Bot(command_prefix='!', intents=discord.Intents.all())
-
-@bot.event
-async def on_ready():
-    print('Starting the bot.')
-    channel = bot.get_channel(1071138999604891729)
-    await channel.send('Initialized the bot.')
-
-@bot.event
-async def on_message(message):
-    # Ignore messages from the bot itself
-    if message.author == bot.user:
-        return
-    await process_log(message)
-    # Process other commands
-    await bot.process_commands(message)
-
-async def process_log(message):
-    matches = []
-    # Check if the message contains a valid link
-    link_pattern = r'https:\/\/paste\.ee\/p\/\w+|https:\/\/mclo\.gs\/\w+|https?:\/\/[\w\/.]+\.(?:txt|log)'
-    matches = re.findall(link_pattern, message.content)
-    if message.attachments:
-        for attachment in message.attachments:
-            file_url = attachment.url
-            matches.append(file_url)
-    # Process each log link
-    for match in matches:
-        # Parse the log
-        results = parse_log(match)
-        # Check if there are results to send
-        if results:
-            # Join the results with newlines
-            response = '\n'.join(results)
-            # Send the message
-            await message.channel.send(response)
-            # Return to prevent sending a duplicate message
-            return
-
+import asyncio
+import os
+import discord
+from discord.ext import commands
+from dotenv import load_dotenv
+from cache import ResultCache
+from fetcher import FetchError
+from metrics import Metrics, serve as serve_metrics
+from pipeline import LogPipeline
+from prefilter import MessageFilter
+
+load_dotenv()
+bot_token = os.getenv('bot_token')
+message_time_budget = float(os.getenv('message_time_budget', 10))
+metrics_port = int(os.getenv('metrics_port', 0))
+# e.g. 0.0.0.0 when Prometheus scrapes from another machine
+metrics_host = os.getenv('metrics_host') or '127.0.0.1'
+# timing every download and detector is off unless asked for
+metrics = Metrics() if os.getenv('metrics') or metrics_port else None
+
+message_filter = MessageFilter(
+    # channel ids, comma separated; empty means every channel the bot can see
+    channels=[int(channel) for channel in os.getenv('channels', '').split(',') if channel.strip()],
+    max_attachment_size=int(os.getenv('max_attachment_size', 100*1024*1024)),
+)
+
+# With shard_count set, this process only connects the shards in shard_ids (all of them if
+# empty); shards.py starts one process per group of shards, all sharing cache_path
+shard_count = int(os.getenv('shard_count', 0))
+shard_ids = [int(shard_id) for shard_id in os.getenv('shard_ids', '').split(',') if shard_id.strip()] or None
+if shard_count:
+    bot = commands.AutoShardedBot(command_prefix='!', intents=discord.Intents.all(), shard_count=shard_count, shard_ids=shard_ids)
+else:
+    bot = commands.Bot(command_prefix='!', intents=discord.Intents.all())
+log_pipeline = LogPipeline(
+    concurrency=int(os.getenv('log_concurrency', 4)),
+    parse_workers=int(os.getenv('parse_workers', 2)),
+    queue_size=int(os.getenv('log_queue_size', 32)),
+    head_size=int(os.getenv('log_head_size', 1024*1024)),
+    tail_size=int(os.getenv('log_tail_size', 4*1024*1024)),
+    max_download_size=int(os.getenv('max_download_size', 64*1024*1024)),
+    # compressed uploads stop being read once this much is decompressed
+    max_log_size=int(os.getenv('max_log_size', 256*1024*1024)),
+    retries=int(os.getenv('download_retries', 2)),
+    resume_size=int(os.getenv('resume_size', 64)),
+    # CPU seconds parsing one log can take before it's cut off
+    parse_budget=float(os.getenv('parse_budget', 5)),
+    # paste.ee and mclo.gs rate limits are split between the shard processes
+    rate_share=1 / int(os.getenv('shard_processes', 1)),
+    cache=ResultCache(
+        max_size=int(os.getenv('cache_size', 1024)),
+        ttl=int(os.getenv('cache_ttl', 24*60*60)),
+        path=os.getenv('cache_path') or None,
+    ),
+    metrics=metrics,
+)
+
+async def setup_hook():
+    await log_pipeline.start()
+    if metrics_port:
+        await serve_metrics(metrics, metrics_port, metrics_host)
+
+bot.setup_hook = setup_hook
+
+@bot.event
+async def on_ready():
+    print('Starting the bot.')
+    channel = bot.get_channel(1071138999604891729)
+    # only the process with that guild's shard can see the channel
+    if channel:
+        await channel.send('Initialized the bot.')
+
+@bot.event
+async def on_message(message):
+    # Ignore messages from the bot itself
+    if message.author == bot.user:
+        return
+    await process_log(message)
+    # Process other commands
+    await bot.process_commands(message)
+
+@bot.command(aliases=['cachestats'])
+async def stats(ctx):
+    stats = log_pipeline.stats()
+    lines = [f"Links: {stats['link_hits']} hits / {stats['link_misses']} misses, "
+             f"results: {stats['result_hits']} hits / {stats['result_misses']} misses, "
+             f"saved ~{stats['saved_seconds']:.1f}s of downloading and parsing.",
+             f"Messages: {message_filter.messages} seen, {message_filter.skipped} without logs."]
+    if metrics:
+        lines.append(f"Downloaded {metrics.counter('downloaded_bytes_total') / 1024 / 1024:.1f} MB in {stats['downloads']} downloads "
+                     f"({stats['download_seconds']:.1f}s), parsed {stats['parses']} logs ({stats['parse_seconds']:.1f}s).")
+        # the detectors that took the most time overall
+        detectors = sorted(metrics.by_label('detector_seconds', 'detector').items(), key=lambda item: -item[1].sum)
+        for name, histogram in detectors[:5]:
+            lines.append(f"`{name}`: {histogram.sum * 1000:.1f} ms total, p95 < {histogram.quantile(0.95) * 1000:g} ms, "
+                         f"fired {metrics.counter('detector_fired_total', detector=name)} times")
+    await ctx.send('\n'.join(lines))
+
+STILL_READING = '⏳ Still reading the rest of the log...'
+
+async def process_log(message):
+    # Links and attachments that could be logs, most messages have neither
+    matches = message_filter.links(message)
+    if not matches:
+        return
+    # Download and parse all logs at the same time, without blocking the event loop
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + message_time_budget
+    links = list(dict.fromkeys(matches))
+    previews = [loop.create_future() for _ in links]
+    futures = [await log_pipeline.submit(link, preview) for link, preview in zip(links, previews)]
+    # A big log's launcher header is in long before the rest of it, so what the header shows
+    # is sent as soon as every log has either that or its full result, and the message is
+    # edited once the whole logs are parsed
+    while not all(preview.done() or future.done() for preview, future in zip(previews, futures)):
+        waiting = [waited for pair in zip(previews, futures) if not any(done.done() for done in pair) for waited in pair]
+        if not (await asyncio.wait(waiting, timeout=max(deadline - loop.time(), 0), return_when=asyncio.FIRST_COMPLETED))[0]:
+            break
+    sent = []
+    if not all(future.done() for future in futures):
+        results, _ = get_results(futures, previews)
+        if results:
+            for response in split_response(results + [STILL_READING]):
+                sent.append(await message.channel.send(response))
+            observe_answer('first_answer_seconds', start)
+    # Answer with whatever finished in time, the rest still ends up in the cache
+    await asyncio.wait(futures, timeout=max(deadline - loop.time(), 0))
+    results, failed = get_results(futures, previews)
+    if failed and not results:
+        results.append("🟡 I couldn't download your log right now, the paste site seems to be busy. Try sending it again in a bit.")
+    responses = split_response(results)
+    for index, response in enumerate(responses):
+        if index < len(sent):
+            if sent[index].content != response:
+                await sent[index].edit(content=response)
+        else:
+            await message.channel.send(response)
+    # the header findings were all the rest of the log ruled out
+    for extra in sent[len(responses):]:
+        await extra.delete()
+    if responses:
+        if not sent:
+            observe_answer('first_answer_seconds', start)
+        observe_answer('answer_seconds', start)
+
+def get_results(futures, previews):
+    # the issues found, with what the header showed for logs that aren't done yet, and
+    # whether a download failed
+    results = []
+    failed = False
+    for future, preview in zip(futures, previews):
+        if future.done() and not future.cancelled():
+            if isinstance(future.exception(), FetchError):
+                failed = True
+            elif future.exception() is None and future.result():
+                results += future.result()
+        elif preview.done() and preview.result():
+            results += preview.result()
+    # The same issue found in several logs is only sent once
+    return list(dict.fromkeys(results)), failed
+
+def observe_answer(name, start):
+    if metrics:
+        metrics.observe(name, asyncio.get_running_loop().time() - start)
+
+def split_response(results, limit=2000):
+    # Discord messages can't be longer than 2000 characters
+    responses = []
+    response = ''
+    for result in results:
+        if response and len(response) + 1 + len(result) > limit:
+            responses.append(response)
+            response = ''
+        response = f'{response}\n{result}' if response else result[:limit]
+    if response:
+        responses.append(response)
+    return responses
+
 bot.run(bot_token)
\ No newline at end of file
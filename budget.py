@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import signal
+import threading
+from contextlib import contextmanager
+
+# Logs are text anyone can post, and nothing bounds how long a regex takes on the wrong
+# input. Parsing one log gets PARSE_BUDGET seconds of CPU time; a SIGPROF timer then
+# interrupts whatever is running, a regex match included, since re checks for signals while
+# it backtracks. Only in the main thread of a process (pool workers are), and not on Windows.
+PARSE_BUDGET = 5
+TIMER = hasattr(signal, 'setitimer')
+
+class BudgetExceeded(Exception):
+    # parsing took more CPU time than it was given; the message names the function that
+    # was running, usually the detector or fact whose pattern ran away
+    pass
+
+def get_running(frame):
+    # the innermost function outside the re module
+    while frame is not None and frame.f_back is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module != 're' and not module.startswith('re.'):
+            break
+        frame = frame.f_back
+    return frame.f_code.co_name if frame is not None else 'unknown'
+
+@contextmanager
+def cpu_budget(seconds=PARSE_BUDGET):
+    if not seconds or not TIMER or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    def expired(signum, frame):
+        raise BudgetExceeded(f'{get_running(frame)} ran past the {seconds:g}s CPU budget')
+    previous = signal.signal(signal.SIGPROF, expired)
+    signal.setitimer(signal.ITIMER_PROF, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, previous)
+
+def run_with_budget(seconds, func, *args):
+    # for a process pool, which can only be handed functions defined at module level
+    with cpu_budget(seconds):
+        return func(*args)
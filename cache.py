@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+
+PRUNE_EVERY = 64 # database writes between deleting expired and excess rows
+BUSY_TIMEOUT = 1 # seconds a write waits for another process's write, before it's left out
+OPEN_TIMEOUT = 10 # seconds opening the database waits for the other processes opening it
+
+def content_hash(log):
+    return hashlib.blake2b(log.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+class LRUCache:
+    # Keeps at most `max_size` entries, each for at most `ttl` seconds.
+    def __init__(self, max_size=1024, ttl=24*60*60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and time.time() - entry[0] > self.ttl:
+            del self.entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value, created=None):
+        self.entries[key] = (created or time.time(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+class ResultCache:
+    # Two levels: direct link -> content hash, content hash -> list of issues.
+    # The same link posted again skips the download, the same log posted under a
+    # different link skips the parsing. With `path` set, entries are also kept in an
+    # SQLite database so they survive restarts, and several bot processes can share one
+    # database: claim() makes sure only one of them downloads a link at a time.
+    # The database can be used from another thread than the one that made the cache, by one
+    # thread at a time; LogPipeline makes all its calls from a thread of its own.
+    def __init__(self, max_size=1024, ttl=24*60*60, path=None):
+        self.links = LRUCache(max_size, ttl)
+        self.results = LRUCache(max_size, ttl)
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, timeout=OPEN_TIMEOUT, check_same_thread=False)
+            # readers don't block the writer, so the other processes can keep polling
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS links (link TEXT PRIMARY KEY, hash TEXT, created REAL)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS results (hash TEXT PRIMARY KEY, issues TEXT, created REAL)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS claims (link TEXT PRIMARY KEY, owner TEXT, created REAL)')
+            for table in ('links', 'results'):
+                self.db.execute(f'CREATE INDEX IF NOT EXISTS {table}_created ON {table} (created)')
+            self.db.commit()
+            self.db.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}')
+        self.writes = 0
+
+    def get_hash(self, link):
+        value = self.links.get(link)
+        if value is None and self.db:
+            row = self.db.execute('SELECT hash, created FROM links WHERE link = ? AND created > ?',
+                                  (link, time.time() - self.links.ttl)).fetchone()
+            if row:
+                value = row[0]
+                self.links.set(link, value, row[1])
+                self.links.misses -= 1
+                self.links.hits += 1
+        return value
+
+    def get_result(self, log_hash):
+        value = self.results.get(log_hash)
+        if value is None and self.db:
+            row = self.db.execute('SELECT issues, created FROM results WHERE hash = ? AND created > ?',
+                                  (log_hash, time.time() - self.results.ttl)).fetchone()
+            if row:
+                value = json.loads(row[0])
+                self.results.set(log_hash, value, row[1])
+                self.results.misses -= 1
+                self.results.hits += 1
+        return value
+
+    def get(self, link):
+        log_hash = self.get_hash(link)
+        if log_hash is None:
+            return None
+        return self.get_result(log_hash)
+
+    def set(self, link, log_hash, issues):
+        self.links.set(link, log_hash)
+        self.results.set(log_hash, issues)
+        if self.db:
+            now = time.time()
+            try:
+                with self.db:
+                    self.db.execute('INSERT OR REPLACE INTO links VALUES (?, ?, ?)', (link, log_hash, now))
+                    self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?)', (log_hash, json.dumps(issues), now))
+                    if self.writes % PRUNE_EVERY == 0:
+                        self.prune(now)
+            except sqlite3.OperationalError:
+                return # the database is locked, the other processes parse this log themselves
+            self.writes += 1
+
+    def prune(self, now):
+        # in between, the tables can hold up to PRUNE_EVERY rows more than max_size
+        for table in ('links', 'results'):
+            self.db.execute(f'DELETE FROM {table} WHERE created <= ?', (now - self.links.ttl,))
+            self.db.execute(f'DELETE FROM {table} WHERE created < (SELECT created FROM {table} ORDER BY created DESC '
+                            'LIMIT 1 OFFSET ?)', (self.links.max_size - 1,))
+
+    def shared(self, link):
+        # a result another process stored since this one last looked, straight from the database
+        if not self.db:
+            return None
+        row = self.db.execute('SELECT links.hash, issues, links.created FROM links JOIN results ON links.hash = results.hash '
+                              'WHERE link = ? AND links.created > ?', (link, time.time() - self.links.ttl)).fetchone()
+        if row is None:
+            return None
+        log_hash, issues, created = row
+        self.links.set(link, log_hash, created)
+        self.results.set(log_hash, json.loads(issues), created)
+        return self.results.entries[log_hash][1]
+
+    def claim(self, link, owner, timeout=30):
+        # True if `owner` may download the link, False while another process is still on it;
+        # claims older than `timeout` seconds are from a process that died and are taken over
+        if not self.db:
+            return True
+        now = time.time()
+        # a live claim is only read, so the processes waiting on it don't queue for the write lock
+        row = self.db.execute('SELECT owner, created FROM claims WHERE link = ?', (link,)).fetchone()
+        if row is not None and row[1] > now - timeout:
+            return row[0] == owner
+        try:
+            with self.db:
+                self.db.execute('DELETE FROM claims WHERE link = ? AND created <= ?', (link, now - timeout))
+                self.db.execute('INSERT OR IGNORE INTO claims VALUES (?, ?, ?)', (link, owner, now))
+                row = self.db.execute('SELECT owner FROM claims WHERE link = ?', (link,)).fetchone()
+        except sqlite3.OperationalError:
+            return True # locked for longer than BUSY_TIMEOUT: downloading it twice beats waiting
+        return row is not None and row[0] == owner
+
+    def release(self, link, owner):
+        if self.db:
+            try:
+                with self.db:
+                    self.db.execute('DELETE FROM claims WHERE link = ? AND owner = ?', (link, owner))
+            except sqlite3.OperationalError:
+                pass # the claim runs out after the claim timeout instead
+
+    def stats(self):
+        return {
+            'link_hits': self.links.hits,
+            'link_misses': self.links.misses,
+            'result_hits': self.results.hits,
+            'result_misses': self.results.misses,
+            'links': len(self.links.entries),
+            'results': len(self.results.entries),
+        }
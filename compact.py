@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import re
+from collections import deque
+
+# Logs often repeat the same lines thousands of times in a row (missing textures, render
+# thread warnings every tick, the same exception on every frame). Runs of repeats are cut
+# down to their first copy before the detectors read the log, and how often each was
+# repeated is kept instead.
+#
+# The log is read as records: a line with the `\tat` frames and `Caused by:` lines under it,
+# so a repeated stack trace is one record. A run is a block of up to MAX_PERIOD records
+# that comes again right after itself; the log4j timestamp at the start of a record is left
+# out when comparing, so the same warning on every tick still counts as a repeat.
+RECORD_PATTERN = re.compile(r'(\[(?:\d\d[A-Za-z]{3}\d{4} )?\d\d:\d\d:\d\d(?:[.:,]\d+)?\] )?'
+                            r'([^\n]*\n?(?:(?:\t|Caused by: )[^\n]*\n?)*)')
+CONTINUATIONS = ('\t', 'Caused by: ')
+MAX_PERIOD = 8
+MAX_PENDING = 1024 * 1024
+# Compacting costs more than scanning for signatures, so it only pays off when nearly all
+# of the log goes away. That is guessed from a few samples spread over the log, and small
+# logs are never worth it.
+SAMPLES = 8
+SAMPLE_SIZE = 64 * 1024
+MIN_SAVING = 0.9
+MIN_SIZE = 256 * 1024
+
+class Compactor:
+    # Compacts a log fed to it in pieces, like the chunks of a MappedLog. feed() returns the
+    # compacted text of the records it could finish; the last one might still get more frames
+    # in the next piece, so it is kept until then, or until feed(..., final=True).
+    def __init__(self, max_period=MAX_PERIOD):
+        self.repeats = {} # record or block of records, without timestamps -> extra copies dropped
+        self.window = deque(maxlen=max_period) # the last records, without timestamps
+        self.block = () # the records being repeated, empty outside of a run
+        self.copies = 0 # times the block came again so far
+        self.matched = 0 # records of the block seen again since then
+        self.held = [] # those records, only dropped once the whole block has come again
+        self.pending = ''
+
+    def feed(self, text, final=False):
+        if self.pending:
+            text = self.pending + text
+            self.pending = ''
+        end = len(text) if final else get_records_end(text)
+        out = []
+        keep_from = None if self.held else 0 # records from here on are kept, unless a run starts
+        window = self.window
+        for match in RECORD_PATTERN.finditer(text, 0, end):
+            if match.start() == end:
+                break
+            key = match.group(2)
+            if self.block or key in window:
+                keep_from = self.add(text, match, key, out, keep_from)
+            else:
+                window.append(key)
+        if final:
+            self.end_run(out)
+        else:
+            self.pending = text[end:]
+        if keep_from is not None and keep_from < end:
+            if not out and not keep_from and end == len(text):
+                return text # nothing was dropped
+            out.append(text[keep_from:end])
+        return ''.join(out)
+
+    def add(self, text, match, key, out, keep_from):
+        # a record goes into a run, or is kept; returns where kept text starts again
+        if self.block:
+            if key == self.block[self.matched]:
+                if not self.held and keep_from < match.start():
+                    out.append(text[keep_from:match.start()])
+                if len(self.block) > 1:
+                    self.held.append(match.group())
+                    self.matched += 1
+                    if self.matched < len(self.block):
+                        return None
+                    self.held = []
+                    self.matched = 0
+                self.copies += 1
+                return match.end()
+            if self.end_run(out):
+                keep_from = match.start()
+            if key not in self.window:
+                self.window.append(key)
+                return keep_from
+        window = self.window
+        for period in range(1, len(window) + 1):
+            if window[-period] == key:
+                break
+        self.block = tuple(window)[-period:]
+        return self.add(text, match, key, out, keep_from)
+
+    def end_run(self, out):
+        # counts the run's copies; records of a block that stopped repeating part way through
+        # are kept after all, and True is returned if there were any
+        held = self.held
+        if self.copies:
+            block = ''.join(self.block)
+            self.repeats[block] = self.repeats.get(block, 0) + self.copies
+        if held:
+            out += held
+            self.window.extend(self.block[:len(held)])
+            self.held = []
+        self.block = ()
+        self.copies = self.matched = 0
+        return bool(held)
+
+def get_records_end(text):
+    # where the last record that could still get more lines in the next piece starts; a
+    # record longer than MAX_PENDING is cut, so the pieces kept back stay small
+    end = text.rfind('\n') + 1
+    # an unfinished `Caus` line could still turn out to be part of the record above it
+    if not text.startswith(CONTINUATIONS, end) and not 'Caused by: '.startswith(text[end:]):
+        return end
+    limit = len(text) - MAX_PENDING
+    while end > max(limit, 0):
+        end = text.rfind('\n', 0, end - 1) + 1
+        if not text.startswith(CONTINUATIONS, end):
+            return end
+    return end
+
+def count_lines(repeats):
+    # lines dropped by a Compactor
+    return sum((block.count('\n') + (not block.endswith('\n'))) * copies for block, copies in repeats.items())
+
+def sample_ranges(length):
+    # (start, end) of the samples for a log of `length`, an eighth of it at most
+    size = min(SAMPLE_SIZE, length // (8 * SAMPLES))
+    step = (length - size) // (SAMPLES - 1)
+    return [(index * step, index * step + size) for index in range(SAMPLES)]
+
+def get_saving(samples):
+    # share of the samples' text that compacting them drops; samples can start and end
+    # in the middle of a line, that only makes the guess a bit off
+    total = dropped = 0
+    for sample in samples:
+        total += len(sample)
+        dropped += len(sample) - len(Compactor().feed(sample, final=True))
+    return dropped / total if total else 0
+
+def worth_compacting(log, min_saving=MIN_SAVING):
+    # False for small logs and logs whose samples don't shrink by `min_saving`
+    return len(log) >= MIN_SIZE and get_saving(log[start:end] for start, end in sample_ranges(len(log))) >= min_saving
+
+def compact(log, min_saving=0):
+    # (compacted log, Compactor with the repeat counts); the log itself if nothing repeats.
+    # With `min_saving`, logs that aren't worth_compacting are left as they are, with None
+    # for the compactor.
+    if min_saving and not worth_compacting(log, min_saving):
+        return log, None
+    compactor = Compactor()
+    return compactor.feed(log, final=True), compactor
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import re
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+# A stack trace is an exception line followed by `\tat` frames, with its `Caused by:` chain
+# right after it. Long logs repeat the same trace thousands of times, so every distinct one
+# is parsed once and only counted after that.
+FRAMES_PATTERN = re.compile(r'(?:\tat [^\n]*\n?|\t\.\.\. \d+ more\n?)+')
+# a cause whose frames are all in the trace above only has the ... more line
+FRAMES_START_PATTERN = re.compile(r'\n\t(?:at |\.\.\. \d+ more\n)')
+# some launchers log the exception on the same line as the log4j prefix
+EXCEPTION_PATTERN = re.compile(r'(?:\[[^\n]*?\]: )?(?:Caused by: |Exception in thread "[^"\n]*" )?'
+                               r'((?:[a-zA-Z_$][\w$]*\.)+[a-zA-Z_$][\w$]*)(?::\s?(.*))?$')
+# the exception line is usually right above the frames, unless its message has several lines
+MESSAGE_LINES = 10
+CRASH_REPORT_START = '---- Minecraft Crash Report ----'
+CRASH_REPORT_END = '#@!@# Game crashed!'
+JVM_FATAL_START = 'A fatal error has been detected by the Java Runtime Environment'
+JVM_FATAL_SUMMARY = '---------------  S U M M A R Y'
+HEADER_END = '\nJava Arguments:\n'
+
+def matches(exception, name, message=None):
+    # `message` only has to be the start of the exception's message
+    return exception[0] == name and (message is None or (exception[1] or '').startswith(message))
+
+@dataclass(slots=True)
+class Section:
+    kind: str # 'header', 'game', 'crash_report' or 'jvm_fatal'
+    start: int
+    end: int
+
+@dataclass(slots=True, eq=False)
+class Trace:
+    exceptions: list # (class, message), the thrown one first and the root cause last
+    frames: frozenset # `at` frames of every exception in the chain, without the `at `
+    packages: frozenset # every dotted prefix of those frames' methods
+    section: str
+    count: int = 1
+
+    @property
+    def root(self):
+        return self.exceptions[-1]
+
+    def has(self, name, message=None):
+        return any(matches(exception, name, message) for exception in self.exceptions)
+
+    def caused_by(self, name, message=None):
+        return any(matches(exception, name, message) for exception in self.exceptions[1:])
+
+@dataclass(slots=True)
+class CrashIndex:
+    sections: list = field(default_factory=list)
+    traces: list = field(default_factory=list)
+    by_class: dict = field(default_factory=dict) # exception class anywhere in a chain -> traces
+    by_root: dict = field(default_factory=dict) # root cause class -> traces
+    by_package: dict = field(default_factory=dict) # package, class or method in a frame -> traces
+
+    def section(self, kind):
+        return next((section for section in self.sections if section.kind == kind), None)
+
+    def find(self, name, message=None):
+        # traces with this exception anywhere in their chain
+        return [trace for trace in self.by_class.get(name, ()) if trace.has(name, message)]
+
+    def root_causes(self, name, message=None):
+        return [trace for trace in self.by_root.get(name, ()) if matches(trace.root, name, message)]
+
+    def in_package(self, package):
+        return self.by_package.get(package, [])
+
+def line_start(log, position):
+    return log.rfind('\n', 0, position) + 1
+
+def get_sections(log):
+    # the launcher header, crash reports and JVM fatal errors, with the game log in between
+    found = []
+    header = log.find(HEADER_END)
+    if header != -1:
+        end = log.find('\n\n', header + len(HEADER_END) - 1)
+        found.append(('header', 0, len(log) if end == -1 else end + 2))
+    position = log.find(CRASH_REPORT_START)
+    while position != -1:
+        end = log.find(CRASH_REPORT_END, position)
+        if end == -1:
+            # a crash report cut off without its end marker stops where a JVM error starts,
+            # or that would be taken for part of it
+            end = log.find(JVM_FATAL_START, position)
+            end = len(log) if end == -1 else line_start(log, end)
+            if end and log.startswith('#\n', line_start(log, end - 1)):
+                end = line_start(log, end - 1)
+        else:
+            end = log.find('\n', end) + 1 or len(log)
+        found.append(('crash_report', line_start(log, position), end))
+        position = log.find(CRASH_REPORT_START, end)
+    position = log.find(JVM_FATAL_START)
+    while position != -1:
+        start = line_start(log, position)
+        # the '#' line above belongs to it too
+        if start and log.startswith('#\n', line_start(log, start - 1)):
+            start = line_start(log, start - 1)
+        end = log.find('\n', position) + 1 or len(log)
+        if log.find(JVM_FATAL_SUMMARY, position) != -1:
+            end = len(log) # a whole hs_err_pid file
+        while end < len(log) and log.startswith('#', end):
+            end = log.find('\n', end) + 1 or len(log)
+        found.append(('jvm_fatal', start, end))
+        position = log.find(JVM_FATAL_START, end)
+    sections = []
+    previous = 0
+    for kind, start, end in sorted(found, key=lambda section: section[1]):
+        if start < previous:
+            continue # inside an earlier section, like a crash report quoted in an hs_err file
+        if start > previous:
+            sections.append(Section('game', previous, start))
+        sections.append(Section(kind, start, end))
+        previous = end
+    if previous < len(log):
+        sections.append(Section('game', previous, len(log)))
+    return sections
+
+def get_exception(log, frames_start):
+    # (class, message, start of its line) for the exception above the frames at `frames_start`
+    end = frames_start - 1
+    for _ in range(MESSAGE_LINES):
+        start = line_start(log, end)
+        match = EXCEPTION_PATTERN.match(log, start, end)
+        if match:
+            return match.group(1), match.group(2), start
+        # no message goes on past another trace's frames or a JVM error
+        if not start or log.startswith(('\t', '#'), line_start(log, start - 1)):
+            break
+        end = start - 1
+    return None
+
+def get_packages(frames):
+    # every dotted prefix of the frames' methods: packages, classes and the methods themselves
+    packages = set()
+    for frame in frames:
+        # frames from a module look like java.base/java.lang.Thread.run(Thread.java:833)
+        parts = frame.split('(', 1)[0].rsplit('/', 1)[-1].split('.')
+        packages.update('.'.join(parts[:length]) for length in range(1, len(parts) + 1))
+    return frozenset(packages)
+
+def index_crashes(log, sections=None):
+    index = CrashIndex(get_sections(log) if sections is None else sections)
+    starts = [section.start for section in index.sections]
+    seen = {}
+    chain = []
+    chain_start = chain_end = 0
+    found = FRAMES_START_PATTERN.search(log)
+    while found:
+        position = found.start()
+        end = FRAMES_PATTERN.match(log, position + 1).end()
+        exception = get_exception(log, position + 1)
+        if exception is not None:
+            name, message, start = exception
+            # a Caused by: right below the last frames continues the same trace
+            if not (chain and start == chain_end and log.startswith('Caused by: ', start)):
+                add_trace(index, seen, chain, chain_start, starts)
+                chain = []
+                chain_start = start
+            chain.append((name, message, log[start:end]))
+            chain_end = end
+        found = FRAMES_START_PATTERN.search(log, end - 1)
+    add_trace(index, seen, chain, chain_start, starts)
+    return index
+
+def add_trace(index, seen, chain, start, starts):
+    if not chain:
+        return
+    key = tuple(text for _, _, text in chain)
+    trace = seen.get(key)
+    if trace is not None:
+        trace.count += 1
+        return
+    frames = frozenset(line[4:] for _, _, text in chain for line in text.split('\n') if line.startswith('\tat '))
+    section = index.sections[bisect_right(starts, start) - 1].kind if index.sections else 'game'
+    trace = seen[key] = Trace([(name, message) for name, message, _ in chain], frames, get_packages(frames), section)
+    index.traces.append(trace)
+    for name in {name for name, _ in trace.exceptions}:
+        index.by_class.setdefault(name, []).append(trace)
+    index.by_root.setdefault(trace.root[0], []).append(trace)
+    for package in trace.packages:
+        index.by_package.setdefault(package, []).append(trace)
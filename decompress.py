@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import struct
+import zlib
+
+try:
+    import zstandard # optional, pip install zstandard
+except ImportError:
+    zstandard = None
+
+# Minecraft gzips old logs (2024-01-01-1.log.gz), and players zip up crash reports or their
+# whole .minecraft folder. Compressed uploads are told apart by their first bytes and
+# decompressed as they stream in, STEP bytes at a time, so a small chunk of a compression
+# bomb can't turn into gigabytes at once. Every decompressed byte counts towards
+# `max_size`, even in zip members that are skipped, and decoding stops past it.
+GZIP_MAGIC = b'\x1f\x8b'
+ZIP_MAGIC = b'PK\x03\x04'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+# without zstandard, .zst files would be read as their compressed bytes, so they aren't taken
+COMPRESSED_EXTENSIONS = ('.gz', '.zip') + (('.zst',) if zstandard is not None else ())
+COMPRESSED_CONTENT_TYPES = (('application/gzip', 'application/x-gzip', 'application/zip', 'application/x-zip-compressed')
+                            + (('application/zstd',) if zstandard is not None else ()))
+MAGIC_SIZE = 4
+STEP = 64 * 1024
+# zstd has no output limit per call, so it's given this much input at a time instead
+ZSTD_SLICE = 1024
+LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+ZIP64_EXTRA = 0x0001
+
+def is_log_member(name):
+    # the files in a zip that are read: latest.log, crash reports and JVM crash logs
+    base = name.rsplit('/', 1)[-1]
+    if base == 'latest.log' or (base.startswith('hs_err_pid') and base.endswith('.log')):
+        return True
+    return base.endswith('.txt') and (base.startswith('crash-') or 'crash-reports/' in name)
+
+def get_decoder(start, max_size):
+    # a decoder for data starting with `start`, None if it isn't compressed
+    if start.startswith(GZIP_MAGIC):
+        return GzipDecoder(max_size)
+    if start.startswith(ZIP_MAGIC):
+        return ZipDecoder(max_size)
+    if start.startswith(ZSTD_MAGIC) and zstandard is not None:
+        return ZstdDecoder(max_size)
+    return None
+
+class Decoder:
+    # decode(data) yields what `data` decompresses to as it arrives; `finished` is set once
+    # nothing more will come out, so the rest doesn't need to be downloaded
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.finished = False
+
+    def inflate(self, inflater, data):
+        # everything `data` inflates to, STEP bytes at a time; the input past the end of
+        # the stream is left in inflater.unused_data
+        while not self.finished:
+            piece = inflater.decompress(data, STEP)
+            data = inflater.unconsumed_tail
+            self.size += len(piece)
+            if self.size >= self.max_size:
+                self.finished = True
+            if piece:
+                yield piece
+            # a full piece can leave output in the inflater even without input left
+            if inflater.eof or not data and len(piece) < STEP:
+                return
+
+class GzipDecoder(Decoder):
+    # a .gz file, all of its members
+    def __init__(self, max_size):
+        super().__init__(max_size)
+        self.inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decode(self, data):
+        try:
+            while data and not self.finished:
+                yield from self.inflate(self.inflater, data)
+                data = b''
+                if self.inflater.eof:
+                    data = self.inflater.unused_data
+                    self.inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        except zlib.error:
+            self.finished = True # corrupt, or padding after the last member
+
+class ZstdDecoder(Decoder):
+    def __init__(self, max_size):
+        super().__init__(max_size)
+        self.inflater = zstandard.ZstdDecompressor().decompressobj()
+
+    def decode(self, data):
+        try:
+            for start in range(0, len(data), ZSTD_SLICE):
+                if self.finished:
+                    return
+                output = self.inflater.decompress(data[start:start + ZSTD_SLICE])
+                for offset in range(0, len(output), STEP):
+                    piece = output[offset:offset + STEP]
+                    self.size += len(piece)
+                    yield piece
+                    if self.size >= self.max_size:
+                        self.finished = True
+                        return
+        except zstandard.ZstdError:
+            self.finished = True
+
+class ZipDecoder(Decoder):
+    # A zip read front to back through its local file headers, without the central directory
+    # at the end. The members is_log_member picks are decompressed one after another, the
+    # others are skipped; reading stops at the central directory. A member that is stored
+    # with its size after the data can't be skipped, so reading stops there too.
+    def __init__(self, max_size):
+        super().__init__(max_size)
+        self.pending = b''
+        self.member = None # (wanted, method, compressed bytes left or None, has a data descriptor)
+        self.inflater = None
+        self.descriptor = False # a data descriptor comes next
+        self.line_ended = True
+        self.separate = False # members that don't end with a newline get one before the next
+
+    def decode(self, data):
+        self.pending += data
+        try:
+            while not self.finished:
+                if self.descriptor:
+                    if not self.skip_descriptor():
+                        return
+                elif self.member is None:
+                    if not self.read_header():
+                        return
+                elif not (yield from self.read_member()):
+                    return
+        except zlib.error:
+            self.finished = True
+
+    def read_header(self):
+        # False until the whole header is in
+        pending = self.pending
+        if len(pending) < 4:
+            return False
+        if not pending.startswith(ZIP_MAGIC):
+            self.finished = True # the central directory
+            return False
+        if len(pending) < LOCAL_HEADER.size:
+            return False
+        _, _, flags, method, _, _, _, compressed, _, name_length, extra_length = LOCAL_HEADER.unpack_from(pending)
+        end = LOCAL_HEADER.size + name_length + extra_length
+        if len(pending) < end:
+            return False
+        name = pending[LOCAL_HEADER.size:LOCAL_HEADER.size + name_length].decode('utf-8' if flags & 0x800 else 'cp437', 'replace')
+        if compressed == 0xFFFFFFFF:
+            compressed = get_zip64_size(pending[LOCAL_HEADER.size + name_length:end])
+        self.pending = pending[end:]
+        has_descriptor = bool(flags & 0x08)
+        supported = not flags & 0x01 and method in (0, 8) # not encrypted, stored or deflated
+        if has_descriptor and not (supported and method == 8):
+            self.finished = True # no way to find where it ends
+            return False
+        wanted = supported and is_log_member(name)
+        self.member = (wanted, method, None if has_descriptor else compressed, has_descriptor)
+        # skipped members are only inflated when that's the only way to find their end
+        self.inflater = zlib.decompressobj(-zlib.MAX_WBITS) if method == 8 and (wanted or has_descriptor) else None
+        self.separate = wanted and not self.line_ended
+        return True
+
+    def read_member(self):
+        # yields the member's output; returns False when more data is needed
+        wanted, method, left, has_descriptor = self.member
+        if self.separate:
+            self.separate = False
+            self.line_ended = True
+            yield b'\n'
+        data = self.pending if left is None else self.pending[:left]
+        if self.inflater is None:
+            # stored, or skipped with a known size
+            if wanted:
+                for offset in range(0, len(data), STEP):
+                    piece = data[offset:offset + STEP]
+                    self.size += len(piece)
+                    self.line_ended = piece.endswith(b'\n')
+                    yield piece
+                if self.size >= self.max_size:
+                    self.finished = True
+            consumed = len(data)
+            ended = left is not None and consumed == left
+        else:
+            for piece in self.inflate(self.inflater, data):
+                if wanted:
+                    self.line_ended = piece.endswith(b'\n')
+                    yield piece
+            ended = self.inflater.eof
+            # at the end of the stream, what's left of the input is in both of these
+            consumed = len(data) - len(self.inflater.unused_data if ended else self.inflater.unconsumed_tail)
+        self.pending = self.pending[consumed:]
+        if left is not None:
+            self.member = (wanted, method, left - consumed, has_descriptor)
+        if ended:
+            self.member = None
+            self.inflater = None
+            self.descriptor = has_descriptor
+            return True
+        return consumed > 0 and bool(self.pending)
+
+    def skip_descriptor(self):
+        # crc and sizes after a member's data, with or without a signature, and with 8 byte
+        # sizes in a zip64 file; which one it is shows by where the next header starts
+        signed = self.pending.startswith(DESCRIPTOR_SIGNATURE)
+        for size in ((16, 24) if signed else (12, 20)):
+            if len(self.pending) < size + 4:
+                return False
+            if self.pending[size:size + 2] == b'PK':
+                self.pending = self.pending[size:]
+                self.descriptor = False
+                return True
+        self.finished = True
+        return False
+
+def get_zip64_size(extra):
+    # the compressed size from a zip64 extra field, after the uncompressed one
+    offset = 0
+    while offset + 4 <= len(extra):
+        kind, length = struct.unpack_from('<HH', extra, offset)
+        if kind == ZIP64_EXTRA and length >= 16:
+            return struct.unpack_from('<Q', extra, offset + 12)[0]
+        offset += 4 + length
+    return 0xFFFFFFFF
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import aiohttp
+from cache import LRUCache, content_hash
+from logbuffer import CHUNK_SIZE, HEAD_SIZE, MAX_DOWNLOAD_SIZE, MAX_LOG_SIZE, TAIL_SIZE, LogBuffer
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# requests per second and burst, paste.ee and mclo.gs rate limit their APIs
+HOST_LIMITS = {
+    'paste.ee': (2, 5),
+    'api.mclo.gs': (2, 5),
+}
+DEFAULT_LIMIT = (5, 10)
+
+class FetchError(Exception):
+    # the host kept failing or timing out after every retry
+    pass
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+@dataclass(slots=True)
+class Fetched:
+    text: str = None
+    hash: str = None # only set when the host sent an ETag or Last-Modified
+    received: int = 0
+    truncated: bool = False
+    not_modified: bool = False
+
+def get_retry_after(value):
+    # seconds, from either form of the Retry-After header
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+
+class Fetcher:
+    # Downloads logs over one pooled keep-alive session. Each host has a token bucket so
+    # paste.ee and mclo.gs aren't sent more than they allow, and 5xx/429 responses, timeouts
+    # and connection errors are retried `retries` times with exponential backoff before
+    # FetchError is raised. Other non-200 responses give None. ETag and Last-Modified are
+    # remembered, so a link fetched again gets a 304 with only the hash of the log.
+    # aiohttp asks for gzip or deflate transfer compression (and br once brotli is installed)
+    # and undoes it; gzip, zip and zstd files are decompressed by the LogBuffer.
+    # `rate_share` is this process's part of the host limits when several bot processes run.
+    # fetch(..., on_header) calls on_header(text) with the start of the log as soon as its
+    # launcher header is in, if more of the log is still to come.
+    def __init__(self, concurrency=4, timeout=5, retries=2, backoff=0.5, max_delay=4, host_limits=None,
+                 head_size=HEAD_SIZE, tail_size=TAIL_SIZE, max_download_size=MAX_DOWNLOAD_SIZE, validators_size=4096,
+                 rate_share=1, max_log_size=MAX_LOG_SIZE):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.host_limits = dict(HOST_LIMITS, **(host_limits or {}))
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self.max_download_size = max_download_size
+        self.max_log_size = max_log_size
+        self.rate_share = rate_share
+        self.buckets = {}
+        self.validators = LRUCache(validators_size, ttl=7*24*60*60)
+        self.session = None
+        self.retried = 0
+
+    async def start(self):
+        self.session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            connector=aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60),
+        )
+
+    async def close(self):
+        await self.session.close()
+
+    def bucket(self, host):
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            rate, burst = self.host_limits.get(host, DEFAULT_LIMIT)
+            bucket = self.buckets[host] = TokenBucket(rate * self.rate_share, max(burst * self.rate_share, 1))
+        return bucket
+
+    async def fetch(self, url, conditional=True, on_header=None):
+        bucket = self.bucket(urlsplit(url).hostname)
+        for attempt in range(self.retries + 1):
+            await bucket.acquire()
+            delay = None
+            try:
+                fetched = await self.get(url, conditional, on_header)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                if attempt == self.retries:
+                    raise FetchError(f'{url}: {error!r}') from error
+            else:
+                if isinstance(fetched, Fetched):
+                    return fetched
+                status, delay = fetched
+                if status not in RETRY_STATUSES:
+                    return None
+                if attempt == self.retries:
+                    raise FetchError(f'{url}: HTTP {status}')
+            self.retried += 1
+            if delay is None:
+                delay = self.backoff * 2 ** attempt * random.uniform(0.5, 1)
+            await asyncio.sleep(min(max(delay, 0), self.max_delay))
+
+    async def get(self, url, conditional, on_header=None):
+        # a Fetched, or the status code and Retry-After when it wasn't 200 or 304
+        headers = {}
+        known = self.validators.get(url) if conditional else None
+        if known:
+            etag, last_modified, _ = known
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        async with self.session.get(url, headers=headers) as response:
+            if response.status == 304 and known:
+                return Fetched(hash=known[2], not_modified=True)
+            if response.status != 200:
+                return response.status, get_retry_after(response.headers.get('Retry-After'))
+            buffer = LogBuffer(self.head_size, self.tail_size, self.max_download_size, response.charset or 'utf-8',
+                               self.max_log_size)
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                if not buffer.feed(chunk):
+                    break
+                if buffer.decoder is not None:
+                    await asyncio.sleep(0) # a chunk can decompress to megabytes, others get a turn
+                if on_header is not None:
+                    header = buffer.header()
+                    if header is not None:
+                        # not once the whole response is in: content_length is the compressed size
+                        # under Content-Encoding, so it can't be compared with what was received
+                        if header and not response.content.at_eof():
+                            on_header(header)
+                        on_header = None
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+        fetched = Fetched(buffer.text(), received=buffer.received, truncated=buffer.truncated)
+        if etag or last_modified:
+            fetched.hash = content_hash(fetched.text)
+            self.validators.set(url, (etag, last_modified, fetched.hash))
+        return fetched
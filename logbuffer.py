@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import mmap
+import os
+import re
+from collections import deque
+from decompress import MAGIC_SIZE, get_decoder
+
+HEAD_SIZE = 1024 * 1024 # launcher header (Params:, Java Arguments:, mods list)
+TAIL_SIZE = 4 * 1024 * 1024 # crash trace at the end of the log
+MAX_DOWNLOAD_SIZE = 64 * 1024 * 1024 # stop reading after this many bytes
+MAX_LOG_SIZE = 256 * 1024 * 1024 # or after this many once decompressed, against compression bombs
+CHUNK_SIZE = 64 * 1024
+MAPPED_CHUNK_SIZE = 4 * 1024 * 1024
+MADVISE = hasattr(mmap, 'MADV_DONTNEED') # not on Windows
+# the launcher header ends with the Java Arguments: section; a log without one this far in
+# doesn't have one
+HEADER_END = b'\nJava Arguments:\n'
+PREVIEW_SIZE = 256 * 1024
+
+CHARSET_PATTERN = re.compile(r'charset="?([\w.:-]+)', re.IGNORECASE)
+
+def get_charset(content_type):
+    match = CHARSET_PATTERN.search(content_type or '')
+    if match:
+        return match.group(1)
+    return 'utf-8'
+
+class LogBuffer:
+    # Collects a log chunk by chunk while it downloads. Only the first `head_size` and the
+    # last `tail_size` bytes are kept, so memory stays bounded however big the upload is.
+    # Carriage returns are stripped from every chunk as it comes in. Gzip, zip and zstd
+    # uploads are recognised by their first chunk and decompressed on the way in.
+    def __init__(self, head_size=HEAD_SIZE, tail_size=TAIL_SIZE, max_download_size=MAX_DOWNLOAD_SIZE, encoding='utf-8',
+                 max_log_size=MAX_LOG_SIZE):
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self.max_download_size = max_download_size
+        self.max_log_size = max_log_size
+        self.encoding = encoding
+        self.decoder = None
+        self.start = b'' # first bytes, until there are enough to tell if they're compressed
+        self.head = bytearray()
+        self.tail = deque()
+        self.tail_length = 0
+        self.received = 0
+        self.size = 0
+
+    def feed(self, chunk):
+        # returns False once enough has been read and the download should stop
+        self.received += len(chunk)
+        if self.start is not None:
+            chunk = self.start + chunk
+            if len(chunk) < MAGIC_SIZE:
+                self.start = chunk
+                return True
+            self.start = None
+            self.decoder = get_decoder(chunk, self.max_log_size)
+        if self.decoder is None:
+            self.add(chunk)
+        else:
+            for piece in self.decoder.decode(chunk):
+                self.add(piece)
+            if self.decoder.finished:
+                return False
+        return self.received < self.max_download_size
+
+    def add(self, chunk):
+        chunk = chunk.replace(b'\r', b'')
+        self.size += len(chunk)
+        if len(self.head) < self.head_size:
+            missing = self.head_size - len(self.head)
+            self.head += chunk[:missing]
+            chunk = chunk[missing:]
+        if chunk:
+            self.tail.append(chunk)
+            self.tail_length += len(chunk)
+            while self.tail_length - len(self.tail[0]) >= self.tail_size:
+                self.tail_length -= len(self.tail.popleft())
+
+    def header(self):
+        # what came in so far, cut at a line end, once the launcher header is complete in it,
+        # so the header can be answered while the rest downloads; None until then, and ''
+        # when it's too far in to have a header at all
+        head = self.head
+        start = head.find(HEADER_END, 0, PREVIEW_SIZE)
+        end = head.find(b'\n\n', start + len(HEADER_END) - 1, PREVIEW_SIZE) if start != -1 else -1
+        if end == -1:
+            return '' if len(head) >= min(PREVIEW_SIZE, self.head_size) else None
+        return head[:head.rfind(b'\n') + 1].decode(self.encoding, 'replace')
+
+    @property
+    def truncated(self):
+        return self.size > len(self.head) + self.tail_length or self.tail_length > self.tail_size
+
+    def text(self):
+        if self.start:
+            self.add(self.start) # a log too short to be compressed
+            self.start = None
+        head = bytes(self.head)
+        tail = b''.join(self.tail)[-self.tail_size:] if self.tail else b''
+        if not self.truncated:
+            return (head + tail).decode(self.encoding, 'replace')
+        # Cut at line boundaries so no line is half kept
+        head = head[:head.rfind(b'\n') + 1]
+        tail = tail[tail.find(b'\n') + 1:]
+        skipped = self.size - len(head) - len(tail)
+        return (head.decode(self.encoding, 'replace')
+                + f'[... {skipped} bytes skipped ...]\n'
+                + tail.decode(self.encoding, 'replace'))
+
+class MappedLog:
+    # A local log file read through mmap and decoded one chunk at a time, so a 100 MB
+    # latest.log is never held as bytes, text and stripped text at once. Chunks end at a line
+    # end, and the pages of a chunk are given back once it has been handed out.
+    def __init__(self, path, chunk_size=MAPPED_CHUNK_SIZE, encoding='utf-8'):
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.file = open(path, 'rb')
+        self.map = b''
+        if os.fstat(self.file.fileno()).st_size:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            if MADVISE:
+                self.map.madvise(mmap.MADV_SEQUENTIAL)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        if self.map:
+            self.map.close()
+        self.file.close()
+
+    def __len__(self):
+        return len(self.map)
+
+    def boundary(self, offset):
+        # the start of the first line at or after `offset`
+        if offset >= len(self.map):
+            return len(self.map)
+        end = self.map.find(b'\n', offset)
+        return len(self.map) if end == -1 else end + 1
+
+    def text(self, start=0, end=None):
+        with memoryview(self.map)[start:end] as data:
+            return str(data, self.encoding, 'replace').replace('\r', '')
+
+    def chunks(self, start=0):
+        # (byte offset, text) for every chunk from `start` on
+        while start < len(self.map):
+            end = self.boundary(start + self.chunk_size)
+            yield start, self.text(start, end)
+            if MADVISE:
+                # clean file pages, they are read from the page cache again if needed
+                pages = start - start % mmap.PAGESIZE
+                self.map.madvise(mmap.MADV_DONTNEED, pages, end - pages)
+            start = end
@@ -1,70 +1,326 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import copy
+import hashlib
 import re
-import requests
-from packaging import version
+import time
+from dataclasses import dataclass, field, replace
+from urllib.parse import urlsplit
+from compact import MIN_SAVING, MIN_SIZE, Compactor, compact, count_lines, get_saving, sample_ranges, worth_compacting
+from crashes import get_sections, index_crashes
+from decompress import COMPRESSED_EXTENSIONS
+from logbuffer import CHUNK_SIZE, LogBuffer, MappedLog, get_charset
+from moddb import ModDatabase
+from rules import RuleSet
+from signatures import SignatureScanner
+from versions import VersionRanges, parse_version
 
-def download_from_valid_links(link): # supports paste.ee, mclo.gs, and any direct link to a .txt/.log file
+rules = RuleSet()
+mod_database = ModDatabase()
+# get_os looks for this one outside of a rule
+rules.add_signatures('-natives-windows.jar')
+
+# Patterns are compiled once at import, next to the function that uses them
+PASTE_EE_PATTERN = re.compile(r'https://paste\.ee/(?:p/|d/)([a-zA-Z0-9]+)')
+MCLOGS_PATTERN = re.compile(r'https://mclo\.gs/(\w+)')
+
+def get_direct_link(link): # supports paste.ee, mclo.gs, and any direct link to a .txt/.log file, compressed or not
     # Check if it's a paste.ee link
-    paste_ee_pattern = r'https://paste\.ee/(?:p/|d/)([a-zA-Z0-9]+)'
-    paste_ee_match = re.search(paste_ee_pattern, link)
+    paste_ee_match = PASTE_EE_PATTERN.search(link)
     if paste_ee_match:
         paste_id = paste_ee_match.group(1)
         direct_link = f'https://paste.ee/d/{paste_id}/0'
     else:
         # Check if it's an mclo.gs link
-        mclogs_pattern = r'https://mclo\.gs/(\w+)'
-        mclogs_match = re.search(mclogs_pattern, link)
+        mclogs_match = MCLOGS_PATTERN.search(link)
         if mclogs_match:
             mclogs_id = mclogs_match.group(1)
             direct_link = f'https://api.mclo.gs/1/raw/{mclogs_id}'
         else:
-            # Check if it ends with .txt or .log
-            if link.endswith('.txt') or link.endswith('.log'):
+            # Check if it ends with .txt or .log (or .gz, .zip, .zst), Discord attachment links have a query string after it
+            if urlsplit(link).path.lower().endswith(('.txt', '.log') + COMPRESSED_EXTENSIONS):
                 direct_link = link
             else:
                 return None
-    # Download text from direct link
-    response = requests.get(direct_link, timeout=5)
-    if response.status_code == 200:
-        return response.text.replace('\r', '')
+    return direct_link
+
+session = None
+
+def get_session():
+    # one keep-alive session for every download, retrying 5xx and 429 responses with backoff.
+    # The bot downloads with aiohttp, so requests is only imported once something needs it
+    global session
+    if session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util import Retry
+        session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False)
+        session.mount('https://', HTTPAdapter(max_retries=retry))
+        session.mount('http://', HTTPAdapter(max_retries=retry))
+    return session
+
+def download_from_valid_links(link, **buffer_options):
+    direct_link = get_direct_link(link)
+    if direct_link is None:
+        return None
+    # Download text from direct link, keeping only the start and the end of huge logs
+    with get_session().get(direct_link, timeout=5, stream=True) as response:
+        if response.status_code != 200:
+            return None
+        buffer = LogBuffer(encoding=get_charset(response.headers.get('content-type')), **buffer_options)
+        for chunk in response.iter_content(CHUNK_SIZE):
+            if not buffer.feed(chunk):
+                break
+    return buffer.text()
+
+
+# Sections of the MultiMC/Prism launcher header that facts are read from.
+# Java Arguments: is the last one the launcher prints before the game starts.
+HEADER_SECTIONS = ('Minecraft folder is:', 'Checking Java version...', 'Main Class:', 'Libraries:', 'Mods:', 'Params:', 'Java Arguments:')
+HEADER_SECTION_PATTERN = re.compile('\n(' + '|'.join(map(re.escape, HEADER_SECTIONS)) + ')\n')
+# scanned for with the rest, so logs without a launcher header (crash reports, hs_err_pid
+# files) don't need any regex run over them to find that out
+HEADER_SIGNATURES = frozenset(f'\n{name}\n' for name in HEADER_SECTIONS)
+rules.add_signatures(*HEADER_SIGNATURES, 'with Fabric Loader ')
+
+@dataclass(slots=True)
+class LogFacts:
+    launcher: str = None
+    java_version: str = None # a string like '19.0.2'
+    minecraft_folder: str = None
+    minecraft_version: str = None
+    fabric_loader_version: str = None
+    modloader: str = None
+    java_arguments: str = None
+    max_memory_allocation: int = None # in MB
+    libraries: list = field(default_factory=list)
+    mods: list = field(default_factory=list)
+
+@rules.fact('header_sections')
+def get_header_sections(log, signatures=None):
+    # {section name: the lines under it, up to the next empty line}
+    sections = {}
+    if signatures is not None and not HEADER_SIGNATURES & signatures:
+        return sections
+    for match in HEADER_SECTION_PATTERN.finditer(log):
+        name = match.group(1)
+        if name in sections:
+            continue
+        end = log.find('\n\n', match.end())
+        sections[name] = log[match.end():] if end == -1 else log[match.end():end + 1]
+        if name == 'Java Arguments:':
+            break
+    return sections
+
+def get_first_line(section):
+    if section is not None and '\n' in section:
+        return section.split('\n', 1)[0]
+
+def get_log_facts(log, signatures=None):
+    # every fact at once; with the log's signatures, sections that aren't there are skipped
+    sections = get_header_sections(log, signatures)
+    java_arguments = get_java_arguments(sections)
+    return LogFacts(
+        launcher=get_launcher(log),
+        java_version=get_java_version(sections),
+        minecraft_folder=get_minecraft_folder(sections),
+        minecraft_version=get_minecraft_version(sections),
+        fabric_loader_version=get_fabric_loader_version(log, signatures),
+        modloader=get_modloader(sections),
+        java_arguments=java_arguments,
+        max_memory_allocation=get_max_memory_allocation(java_arguments),
+        libraries=get_libraries(sections),
+        mods=get_mod_list(sections),
+    )
 
+JAVA_VERSION_PATTERN = re.compile(r'Java is version (\S+),')
+MINECRAFT_VERSION_PARAM_PATTERN = re.compile(r'--version (\S+)\s')
+MAX_MEMORY_PATTERN = re.compile(r'-Xmx(\d+)m')
+
+@rules.fact('java_version')
+def get_java_version(header_sections):
+    java_line = get_first_line(header_sections.get('Checking Java version...'))
+    if java_line:
+        version_match = JAVA_VERSION_PATTERN.search(java_line)
+        if version_match:
+            return version_match.group(1)
+
+@rules.fact('minecraft_folder')
+def get_minecraft_folder(header_sections):
+    folder_line = get_first_line(header_sections.get('Minecraft folder is:'))
+    if folder_line is not None:
+        return folder_line.strip()
+
+@rules.fact('minecraft_version')
+def get_minecraft_version(header_sections):
+    params_line = get_first_line(header_sections.get('Params:'))
+    if params_line:
+        version_match = MINECRAFT_VERSION_PARAM_PATTERN.search(params_line)
+        if version_match:
+            return version_match.group(1)
+
+def get_libraries(header_sections):
+    if 'Libraries:' in header_sections:
+        return [line.strip() for line in header_sections['Libraries:'].split('\n') if line.strip()]
+    return []
+
+@rules.fact('java_arguments')
+def get_java_arguments(header_sections):
+    return get_first_line(header_sections.get('Java Arguments:'))
+
+@rules.fact('max_memory_allocation')
+def get_max_memory_allocation(java_arguments):
+    if java_arguments:
+        memory_match = MAX_MEMORY_PATTERN.search(java_arguments)
+        if memory_match:
+            return int(memory_match.group(1))
+
+def get_mod_list(header_sections):
+    if 'Mods:' in header_sections:
+        return get_mods_from_log(header_sections['Mods:'])
+    return []
+
+@rules.fact('mods')
+def get_mod_index(header_sections):
+    return ModIndex(get_mod_list(header_sections))
+
+# the name can't start with whitespace, or \s+ and the name would split the spaces after
+# the mark every possible way before giving up (tests/test_redos.py)
+MOD_JAR_PATTERN = re.compile(r'\[✔️\]\s+([^\[\]\s][^\[\]]*\.jar)')
+MOD_NAME_PATTERN = re.compile(r'\[✔\]\s+([^\[\]\s][^\[\]]*\n)')
 
 def get_mods_from_log(log):
     # Find all lines that have [✔️] or [✔] before a mod name
-    pattern = re.compile(r'\[✔️\]\s+([^\[\]]+\.jar)')
-    mods = pattern.findall(log)
-    pattern = re.compile(r'\[✔\]\s+([^\[\]]+\n)')
-    mods += [mod.rstrip('\n').replace(' ','+')+'.jar' for mod in pattern.findall(log)]
+    mods = MOD_JAR_PATTERN.findall(log)
+    mods += [mod.rstrip('\n').replace(' ','+')+'.jar' for mod in MOD_NAME_PATTERN.findall(log)]
     return mods
 
+# A mod belongs to a category if its file name contains one of the category's keywords
+MOD_CATEGORIES = {
+    'mcsr': ['worldpreview','anchiale','sleepbackground','StatsPerWorld','z-buffer-fog',
+             'tab-focus','setspawn','SpeedRunIGT','atum','standardsettings','forceport',
+             'lazystronghold','antiresourcereload','extra-options','chunkcacher',
+             'serverSideRNG','peepopractice','fast-reset'],
+    'fabric': ['Fabric','voyager','fabric'],
+    'ranked_whitelist': ['sodium','replaymod','extra-options','retino','worldpreview',
+                         'sleepbackground','SpeedRunIGT','atum','standardsettings',
+                         'forceport','lazystronghold','antiresourcereload','serverSideRNG',
+                         'BiomeThreadLocalFix','mcsrranked','fast-reset','starlight',
+                         'phosphor','lithium','krypton','dynamic-menu-fps','lazydfu',
+                         'voyager','FabricProxy-Lite'],
+    'practice': ['peepopractice','stronghold-trainer','noverworld','blinded',
+                 'heatshrink','lavapool-juicer','cageless','no-spawnchunks',
+                 'treasure-juicer','no-basalt','shipwreck-juicer','logmod'],
+    # single mods that detectors look for
+    'ranked': ['mcsrranked'],
+    'speedrunigt': ['SpeedRunIGT'],
+    'fabric_api': ['fabric-api'],
+    'phosphor': ['phosphor'],
+    'starlight': ['starlight'],
+}
+KEYWORD_CATEGORIES = {}
+for category, keywords in MOD_CATEGORIES.items():
+    for keyword in keywords:
+        KEYWORD_CATEGORIES.setdefault(keyword, set()).add(category)
+mod_keyword_scanner = SignatureScanner(KEYWORD_CATEGORIES)
+
+@dataclass(slots=True)
+class ModInfo:
+    filename: str
+    id: str
+    version: str = None
+    minecraft_version: str = None
+
+MINECRAFT_VERSION = r'1\.(?:[2-9]|[1-9]\d)(?:\.[\dx]+)?' # 1.2 and up, so mod versions like 1.0.0 aren't mistaken for it
+MOD_LEADING_MINECRAFT_VERSION_PATTERN = re.compile(rf'(?:mc|MC)?({MINECRAFT_VERSION})-(.+)$')
+MOD_TRAILING_MINECRAFT_VERSION_PATTERN = re.compile(rf'(.+)-(?:mc|MC)?({MINECRAFT_VERSION})$')
+MOD_FILENAME_PATTERN = re.compile(r'(.+?)[-_]((?:v|mc|MC)?\d.*)$')
+MC_PREFIX_PATTERN = re.compile(r'^(?:MC|mc)')
+
+def parse_mod_filename(filename):
+    # 'atum-1.1.6+1.16.1.jar' -> atum, 1.1.6, 1.16.1
+    # 'antiresourcereload-1.16.1-1.0.0.jar' -> antiresourcereload, 1.0.0, 1.16.1
+    name = filename[:-4] if filename.endswith('.jar') else filename
+    match = MOD_FILENAME_PATTERN.match(name)
+    if not match:
+        return ModInfo(filename, name)
+    mod_id, rest = match.groups()
+    minecraft_version = None
+    if '+' in rest:
+        rest, minecraft_version = rest.split('+', 1)
+        minecraft_version = MC_PREFIX_PATTERN.sub('', minecraft_version)
+    else:
+        match = MOD_LEADING_MINECRAFT_VERSION_PATTERN.match(rest)
+        if match:
+            minecraft_version, rest = match.groups()
+        else:
+            match = MOD_TRAILING_MINECRAFT_VERSION_PATTERN.match(rest)
+            if match:
+                rest, minecraft_version = match.groups()
+    return ModInfo(filename, mod_id, rest, minecraft_version)
+
+class ModIndex:
+    # The mods of one log, with the keyword matching done once up front.
+    # Iterates and supports `in` like the plain list of jar names it wraps.
+    def __init__(self, mods):
+        self.mods = list(mods)
+        self.filenames = set(self.mods)
+        self.parsed = []
+        self.infos = {}
+        self.by_keyword = {}
+        self.by_category = {}
+        for mod in self.mods:
+            info = parse_mod_filename(mod)
+            self.parsed.append(info)
+            self.infos.setdefault(info.id.lower(), []).append(info)
+            categories = set()
+            for keyword in mod_keyword_scanner.scan(mod):
+                self.by_keyword.setdefault(keyword, []).append(mod)
+                categories |= KEYWORD_CATEGORIES[keyword]
+            for category in categories:
+                self.by_category.setdefault(category, []).append(mod)
+
+    def __iter__(self):
+        return iter(self.mods)
+
+    def __len__(self):
+        return len(self.mods)
+
+    def __contains__(self, filename):
+        return filename in self.filenames
+
+    def get(self, mod_id):
+        return self.infos.get(mod_id.lower(), [])
+
+    def with_keyword(self, keyword):
+        return self.by_keyword.get(keyword, [])
+
+    def in_category(self, category):
+        return self.by_category.get(category, [])
+
+    def not_in_category(self, category):
+        mods = set(self.in_category(category))
+        return [mod for mod in self.mods if mod not in mods]
+
+@rules.fact('known_mods')
+def get_known_mods(mods):
+    # what mods.json knows about each of the mods, versions and Minecraft versions considered
+    return mod_database.lookup(mods.parsed)
+
+@rules.fact('mods_type')
 def get_mods_type(mods):
     # 0 - no mods, 1 - mods but no fabric mods, 2 - fabric mods but no mcsr mods, 3 - mcsr mods
-    mcsr_mods = ['worldpreview','anchiale','sleepbackground','StatsPerWorld','z-buffer-fog',
-                'tab-focus','setspawn','SpeedRunIGT','atum','standardsettings','forceport',
-                'lazystronghold','antiresourcereload','extra-options','chunkcacher',
-                'serverSideRNG','peepopractice','fast-reset']
-    fabric_mods = ['Fabric','voyager','fabric']
     if len(mods) == 0:
         return 0
-    if any(any(mcsr_mod in mod for mcsr_mod in mcsr_mods) for mod in mods):
+    if mods.in_category('mcsr'):
         return 3
-    if any(any(fabric_mod in mod for fabric_mod in fabric_mods) for mod in mods):
+    if mods.in_category('fabric'):
         return 2
     return 1
 
-def get_java_version(log): # returns a string like '19.0.2'
-    pattern = re.compile(r'Checking Java version\.\.\.\n(.*)\n')
-    match = pattern.search(log)
-    if match:
-        # Extract the Java version from the next line
-        version_line = match.group(1)
-        pattern = re.compile(r'Java is version (\S+),')
-        version_match = pattern.search(version_line)
-        if version_match:
-            return version_match.group(1)
-
+@rules.fact('major_java_version')
 def get_major_java_version(java_version):
     if java_version:
         version_parts = java_version.split('.')
@@ -72,44 +328,51 @@ def get_major_java_version(java_version):
             return int(version_parts[0])
         return int(version_parts[1])
 
-def get_minecraft_folder(log):
-    # Find the line that contains "Minecraft folder is:"
-    pattern = re.compile(r'Minecraft folder is:\n(.*)\n')
-    match = pattern.search(log)
-    if match:
-        # Extract the folder location from the next line
-        folder_line = match.group(1)
-        return folder_line.strip()
-
-def get_os(folder_location,log):
-    if folder_location is None:
-        if '-natives-windows.jar' in log:
+@rules.fact('operating_system')
+def get_os(minecraft_folder,signatures):
+    if minecraft_folder is None:
+        if '-natives-windows.jar' in signatures:
             return 'Windows'
         return None
-    if folder_location.startswith('/'):
-        if len(folder_location) > 1 and folder_location[1].isupper():
+    if minecraft_folder.startswith('/'):
+        if len(minecraft_folder) > 1 and minecraft_folder[1].isupper():
             return 'MacOS'
         return 'Linux'
     return 'Windows'
 
-def get_minecraft_version(log):
-    # Find the line that contains "Params:"
-    pattern = re.compile(r'Params:\n(.*?)\n', re.DOTALL)
-    match = pattern.search(log)
-    if match:
-        # Extract the version value from the next line
-        params_line = match.group(1)
-        version_pattern = re.compile(r'--version (\S+)\s')
-        version_match = version_pattern.search(params_line)
-        if version_match:
-            return version_match.group(1)
+FABRIC_LOADER_PATTERN = re.compile(r'Loading Minecraft \S+ with Fabric Loader (\S+)')
 
 def extract_fabric_loader_version(log):
-    pattern = re.compile(r'Loading Minecraft \S+ with Fabric Loader (\S+)')
-    match = pattern.search(log)
+    match = FABRIC_LOADER_PATTERN.search(log)
     if match:
         return match.group(1)
 
+@rules.fact('fabric_loader_version')
+def get_fabric_loader_version(log, signatures=None):
+    if signatures is None or 'with Fabric Loader ' in signatures:
+        return extract_fabric_loader_version(log)
+
+@rules.fact('sections')
+def get_log_sections(log):
+    # launcher header, game log, crash reports and JVM fatal errors
+    return get_sections(log)
+
+@rules.fact('crashes')
+def get_crashes(log, sections):
+    # stack traces, indexed by exception class, root cause and frame
+    return index_crashes(log, sections)
+
+@rules.fact('repeats')
+def get_repeats(log):
+    # {lines: how many more times they came right after themselves}; parse_text already
+    # knows, this is for logs that weren't compacted
+    return compact(log)[1].repeats
+
+@rules.fact('repeated_lines')
+def get_repeated_lines(repeats):
+    return count_lines(repeats)
+
+@rules.fact('launcher')
 def get_launcher(log):
     if log[:7] == 'MultiMC':
         return 'MultiMC'
@@ -122,46 +385,28 @@ def get_launcher(log):
     if log[:7] == 'UltimMC':
         return 'UltimMC'
 
+@rules.fact('is_multimc_or_fork')
 def get_is_multimc_or_fork(launcher):
     return (launcher in ['MultiMC','Prism','PolyMC','ManyMC','UltimMC'])
 
-def get_modloader(log):
-    # Find the line that contains "Main Class:"
-    pattern = re.compile(r'Main Class:\n(.*)\n')
-    match = pattern.search(log)
-    if match:
-        # Extract the modloader from the next line
-        main_class_line = match.group(1)
-        if 'quilt' in main_class_line:
-            return 'quilt'
-        if 'forge' in main_class_line:
-            return 'forge'
-        if 'fabric' in main_class_line:
-            return 'fabric'
-        if 'forge' in log.split("\nLibraries:\n", 1)[-1].split("\nNative libraries:\n", 1)[0]:
-            return 'forge'
-        if 'net.minecraft.client.main.Main' in main_class_line:
-            return 'vanilla'
-
-def get_java_arguments(log):
-    pattern = re.compile(r'Java Arguments:\n(.*?)\n', re.DOTALL)
-    match = pattern.search(log)
-    if match:
-        arguments_line = match.group(1)
-        return arguments_line
-
-def get_max_memory_allocation(log):
-    # Find the line that contains "Java Arguments:"
-    pattern = re.compile(r'Java Arguments:\n(.*?)\n', re.DOTALL)
-    match = pattern.search(log)
-    if match:
-        # Extract the value after "-Xmx" from the next line
-        arguments_line = match.group(1)
-        memory_pattern = re.compile(r'-Xmx(\d+)m')
-        memory_match = memory_pattern.search(arguments_line)
-        if memory_match:
-            return int(memory_match.group(1))
+@rules.fact('modloader')
+def get_modloader(header_sections):
+    main_class_line = get_first_line(header_sections.get('Main Class:'))
+    libraries = header_sections.get('Libraries:', '')
+    if main_class_line is None:
+        return None
+    if 'quilt' in main_class_line:
+        return 'quilt'
+    if 'forge' in main_class_line:
+        return 'forge'
+    if 'fabric' in main_class_line:
+        return 'fabric'
+    if 'forge' in libraries:
+        return 'forge'
+    if 'net.minecraft.client.main.Main' in main_class_line:
+        return 'vanilla'
 
+@rules.rule(facts=['modloader'], header=True)
 def not_using_fabric(modloader,mods_type):
     # 0 - no mods, 1 - mods but no general mods, 2 - general mods but no mcsr mods, 3 - mcsr mods
     if modloader is None or mods_type is None:
@@ -184,34 +429,36 @@ def not_using_fabric(modloader,mods_type):
         if mods_type == 1:
             return "🟡 You don't seem to be using a modloader. Type `!!fabric` for a guide on how to install fabric."
 
+@rules.rule(facts=['launcher'], header=True)
 def should_use_prism(launcher, operating_system):
     if launcher == 'MultiMC' and operating_system == 'MacOS':
         return '🟡 If you use M1 or M2, it is recommended to use Prism Launcher instead of MultiMC. You can check out this guide for how to set up speedrunning on a Mac: <https://www.youtube.com/watch?v=GomIeW5xdBM>.'
 
-def need_java_17_plus_or_64bit_java(log, mods, major_java_version, mods_type, is_multimc_or_fork):
+CLASS_FILE_VERSION_PATTERN = re.compile(r'class file version (\d+\.\d+)')
+COMPATIBILITY_LEVEL_PATTERN = re.compile(r'The requested compatibility level (JAVA_\d+) could not be set.')
+
+@rules.rule(signatures=[
+    'Minecraft 1.18 Pre Release 2 and above require the use of Java 17',
+    'java.lang.UnsupportedClassVersionError',
+    'The requested compatibility level JAVA_',
+    'Your Java architecture is not matching your system architecture. You might want to install a 64bit Java version.',
+    'Exception in thread "main" java.lang.ClassFormatError: Incompatible magic value 0 in class file sun/security/provider/SunEntries',
+], facts=['major_java_version'])
+def need_java_17_plus_or_64bit_java(log, signatures, mods, known_mods, major_java_version, mods_type, is_multimc_or_fork):
     needed_java_version = None
     output = ''
     if major_java_version and major_java_version < 17:
-        java_17_mods = [mod for mod in mods if
-                       'worldpreview-2.' in mod
-                       or 'worldpreview-1.0' in mod
-                       or 'antiresourcereload' in mod
-                       or 'serverSideRNG' in mod
-                       or 'setspawnmod' in mod
-                       or 'peepopractice' in mod]
+        java_17_mods = known_mods.needing_java(17)
         if len(java_17_mods) >= 1:
             needed_java_version = 17
             output += f"🔴 You are using {'mods' if len(java_17_mods)>1 else 'a mod'} (`{'`, `'.join(java_17_mods)}`) that require{'s' if len(java_17_mods)==1 else ''} using Java {needed_java_version}+."
-            if any('mcsrranked' in mod for mod in mods):
+            if mods.in_category('ranked'):
                 update_java = 0
-            elif (any('antiresourcereload' in mod for mod in java_17_mods)
-            or any('peepopractice' in mod for mod in java_17_mods)
-            or any('setspawnmod' in mod for mod in java_17_mods)):
+            elif any(known_mods[mod].metadata.java_fix == 'update' for mod in java_17_mods):
                 update_java = 1
-            elif (any('worldpreview-2.' in mod for mod in java_17_mods)
-            or any('worldpreview-1.0' in mod for mod in java_17_mods)):
+            elif replaceable := [mod for mod in java_17_mods if known_mods[mod].metadata.java_fix == 'replace']:
                 update_java = -1
-                output += "Delete it and download the latest version that doesn't require Java 17 from <https://github.com/Minecraft-Java-Edition-Speedrunning/mcsr-worldpreview-1.16.1/releases/latest>."
+                output += f"Delete it and download the latest version that doesn't require Java 17 from <{known_mods[replaceable[0]].metadata.url}>."
             else:
                 update_java = 0
             if update_java == 1:
@@ -220,65 +467,76 @@ def need_java_17_plus_or_64bit_java(log, mods, major_java_version, mods_type, is
                 output += f" Delete {'them' if len(java_17_mods)>1 else 'it'} from your `mods` folder."
                 if is_multimc_or_fork:
                     output += "\n*(you can use this guide to update your Java version, which is better for performance:* <https://docs.google.com/document/d/1aPF1lyBAfPWyeHIH80F8JJw8rvvy6lRm0WJ2xxSrRh8/edit#heading=h.62ygxgaxcs5a>)"
-    if 'Minecraft 1.18 Pre Release 2 and above require the use of Java 17' in log:
+    if 'Minecraft 1.18 Pre Release 2 and above require the use of Java 17' in signatures:
         output += "🔴 You are playing on a Minecraft version that requires using Java 17+.\n"
         output += 'Use this guide to update your Java version: <https://docs.google.com/document/d/1aPF1lyBAfPWyeHIH80F8JJw8rvvy6lRm0WJ2xxSrRh8/edit#heading=h.62ygxgaxcs5a>.'
     if output:
         return output
-    if 'java.lang.UnsupportedClassVersionError' in log:
-        pattern = re.compile(r'class file version (\d+\.\d+)')
-        match = pattern.search(log)
+    if 'java.lang.UnsupportedClassVersionError' in signatures:
+        match = CLASS_FILE_VERSION_PATTERN.search(log)
         if match:
             needed_java_version = round(float(match.group(1)))-44
-    pattern = re.compile(r'The requested compatibility level (JAVA_\d+) could not be set.')
-    match = pattern.search(log)
-    if match:
-        needed_java_version = match.group(1).split('_')[1]
+    if 'The requested compatibility level JAVA_' in signatures:
+        match = COMPATIBILITY_LEVEL_PATTERN.search(log)
+        if match:
+            needed_java_version = match.group(1).split('_')[1]
     if needed_java_version:
         return f"🔴 You need to use Java {needed_java_version}+. Use this guide to update your Java version: <https://docs.google.com/document/d/1aPF1lyBAfPWyeHIH80F8JJw8rvvy6lRm0WJ2xxSrRh8/edit#heading=h.62ygxgaxcs5a>."
-    if 'Your Java architecture is not matching your system architecture. You might want to install a 64bit Java version.' in log:
+    if 'Your Java architecture is not matching your system architecture. You might want to install a 64bit Java version.' in signatures:
         return "🔴 You're using 32-bit Java. See here for help installing the correct version: <https://docs.google.com/document/d/1aPF1lyBAfPWyeHIH80F8JJw8rvvy6lRm0WJ2xxSrRh8/edit#heading=h.62ygxgaxcs5a>."
-    if 'Exception in thread "main" java.lang.ClassFormatError: Incompatible magic value 0 in class file sun/security/provider/SunEntries' in log:
+    if 'Exception in thread "main" java.lang.ClassFormatError: Incompatible magic value 0 in class file sun/security/provider/SunEntries' in signatures:
         return f"🔴 Your Java installation seems to be broken. Follow this guide to install and select the recommended Java version: <{'https://docs.google.com/document/d/1aPF1lyBAfPWyeHIH80F8JJw8rvvy6lRm0WJ2xxSrRh8/edit#heading=h.62ygxgaxcs5a' if mods_type == 3 else 'https://prismlauncher.org/wiki/getting-started/installing-java/'}>."
 
-def outdated_srigt_fabric_01415(mods, fabric_loader_version, minecraft_version):
+FABRIC_LOADER_01414 = parse_version('0.14.14')
+
+@rules.rule(facts=['mods'])
+def outdated_srigt_fabric_01415(mods, known_mods, fabric_loader_version, minecraft_version):
     output = ''
-    speedrunigt = [mod for mod in mods if 'SpeedRunIGT' in mod]
+    speedrunigt = mods.in_category('speedrunigt')
     if len(speedrunigt) > 1:
         return '🟡 You have several versions of SpeedRunIGT installed. You should delete the older ones.'
     if len(speedrunigt) == 0:
         return None
     if fabric_loader_version is None:
         return None
-    speedrunigt = speedrunigt[0]
-    pattern = re.compile(r'-(\d+(?:\.\d+)?)\+')
-    match = pattern.search(speedrunigt)
-    if match:
-        speedrunigt = match.group(1)
-        if (version.parse(speedrunigt) < version.parse('13.3')
-        and version.parse(fabric_loader_version) > version.parse('0.14.14')):
+    if known_mods.with_issue('incompatible_with_fabric_loader_0.14.15'):
+        if parse_version(fabric_loader_version) > FABRIC_LOADER_01414:
             output += "🔴 You're using an old version of SpeedRunIGT that is incompatible with Fabric Loader 0.14.15+. You should delete the version of SpeedrunIGT you have and download the latest one from <https://redlime.github.io/SpeedRunIGT/>."
             if minecraft_version != '1.16.1':
                 output += '\n*Alternatively, you can use Fabric Loader 0.14.14.*'
     if output:
         return output
 
+FABRIC_LOADER_VERSIONS = VersionRanges([
+    ('0.12.2', 'old'),
+    ('0.14.0', 'somewhat old'),
+    ('0.14.14', None),
+    ('0.14.15', 'broken'),
+    ('0.14.17', None),
+], default='really old')
+
+@rules.rule(facts=['fabric_loader_version'], header=True)
 def outdated_fabric_loader(fabric_loader_version, mods):
     if fabric_loader_version is None:
         return None
-    if version.parse(fabric_loader_version) < version.parse('0.12.2'):
+    loader = FABRIC_LOADER_VERSIONS[fabric_loader_version]
+    if loader == 'really old':
         return "🔴 You're using a really old version of Fabric Loader. You should update it. Type `!!fabric` for instructions on how to do it."
-    if version.parse(fabric_loader_version) < version.parse('0.14.0'):
-        return f"{'🔴' if any('mcsrranked' in mod for mod in mods) else '🟠'} You're using an old version of Fabric Loader. You should update it. Type `!!fabric` for instructions on how to do it."
-    if version.parse(fabric_loader_version) < version.parse('0.14.14'):
+    if loader == 'old':
+        return f"{'🔴' if mods.in_category('ranked') else '🟠'} You're using an old version of Fabric Loader. You should update it. Type `!!fabric` for instructions on how to do it."
+    if loader == 'somewhat old':
         return "🟡 You're using a somewhat old version of Fabric Loader, you might want to update it."
-    if fabric_loader_version in ('0.14.15','0.14.16'):
+    if loader == 'broken':
         return "🔴 You're using a completely broken version of Fabric Loader. You should update it. Type `!!fabric` for instructions on how to do it."
 
-def not_enough_ram_or_rong_sodium(max_memory_allocation, operating_system, mods, log, java_arguments, mods_type):
+@rules.rule(signatures=[
+    'OutOfMemoryError',
+    'Process crashed with exitcode -805306369',
+], facts=['max_memory_allocation', 'known_mods'], header=True)
+def not_enough_ram_or_rong_sodium(max_memory_allocation, operating_system, known_mods, signatures, java_arguments, mods_type):
     output = ''
     if max_memory_allocation:
-        if (max_memory_allocation < (1200 if ('shenandoah' in java_arguments) else 1900)) and (('OutOfMemoryError' in log) or ('Process crashed with exitcode -805306369' in log)):
+        if (max_memory_allocation < (1200 if ('shenandoah' in java_arguments) else 1900)) and (('OutOfMemoryError' in signatures) or ('Process crashed with exitcode -805306369' in signatures)):
             output += '🔴 You have too little RAM allocated. Check out <https://docs.google.com/document/d/1aPF1lyBAfPWyeHIH80F8JJw8rvvy6lRm0WJ2xxSrRh8/edit#heading=h.y78pfyby3w9b> for a guide on how to fix it.\n'
         elif max_memory_allocation < (850 if ('shenandoah' in java_arguments) else 1200):
             output += '🟠 You likely have too little RAM allocated. Check out <https://docs.google.com/document/d/1aPF1lyBAfPWyeHIH80F8JJw8rvvy6lRm0WJ2xxSrRh8/edit#heading=h.y78pfyby3w9b> for a guide on how to fix it.\n'
@@ -290,34 +548,39 @@ def not_enough_ram_or_rong_sodium(max_memory_allocation, operating_system, mods,
             output += '🟠 You have too much RAM allocated, which can cause lag spikes. Check out <https://docs.google.com/document/d/1aPF1lyBAfPWyeHIH80F8JJw8rvvy6lRm0WJ2xxSrRh8/edit#heading=h.owelqvpsehpw> for a guide on how to fix it.\n'
         elif max_memory_allocation > 3500 and mods_type == 3:
             output += '🟡 You likely have too much RAM allocated, which can cause lag spikes. Check out <https://docs.google.com/document/d/1aPF1lyBAfPWyeHIH80F8JJw8rvvy6lRm0WJ2xxSrRh8/edit#heading=h.owelqvpsehpw> for a guide on how to fix it.\n'
-    if operating_system == 'MacOS' and (('sodium-1.16.1-v1.jar' in mods) or ('sodium-1.16.1-v2.jar' in mods)):
+    if operating_system == 'MacOS' and known_mods.with_issue('macos_memory_leak'):
         output += "🔴 You seem to be using a version of Sodium that has a memory leak on MacOS. Delete the one you have and download <https://github.com/Minecraft-Java-Edition-Speedrunning/mcsr-sodium-mac-1.16.1/releases/tag/latest> instead.\n"
     if output:
         return output.rstrip("\n")
-    if 'OutOfMemoryError' in log:
+    if 'OutOfMemoryError' in signatures:
         return '🔴 You likely either have too little RAM allocated, or experienced a memory leak. Check out <https://docs.google.com/document/d/1aPF1lyBAfPWyeHIH80F8JJw8rvvy6lRm0WJ2xxSrRh8/edit#heading=h.y78pfyby3w9b> and <https://docs.google.com/document/d/1aPF1lyBAfPWyeHIH80F8JJw8rvvy6lRm0WJ2xxSrRh8/edit#heading=h.pmch2xu1p6ce>.'
 
+@rules.rule(facts=['minecraft_folder'], header=True)
 def onedrive(minecraft_folder,launcher):
     if minecraft_folder and ('OneDrive' in minecraft_folder):
         return f"🟡 Your {launcher if launcher else 'launcher'} folder is located in OneDrive. OneDrive can mess with your game files to save space, and this often leads to crashes. You should move it out to a different folder, and may need to reinstall {launcher if launcher else 'the launcher'}."
 
-def hs_err_pid(log, mods):
+@rules.rule(signatures=[
+    'A fatal error has been detected by the Java Runtime Environment',
+    'EXCEPTION_ACCESS_VIOLATION',
+])
+def hs_err_pid(signatures, mods, sections):
     output = ''
-    if ('A fatal error has been detected by the Java Runtime Environment' in log
-    or 'EXCEPTION_ACCESS_VIOLATION' in log):
+    if any(section.kind == 'jvm_fatal' for section in sections) or 'EXCEPTION_ACCESS_VIOLATION' in signatures:
         output += '''🟠 This crash may be caused by one of the following:
 - Concurrently running programs, such as OBS and Discord, that use the same graphics card as the game.
  - Try using window capture instead of game capture in OBS.
  - Try disabling hardware acceleration in Discord.\n'''
-        if any("SpeedRunIGT" in mod for mod in mods):
+        if mods.in_category('speedrunigt'):
             output += '- A compatibility issue between SpeedrunIGT, Intel Graphics and OpenGL. Enable “Safe Font Mode” in SpeedrunIGT options. If the game crashes before you can access that menu, delete .minecraft/speedrunigt.\n'
         output += "- Driver issues. Check if your drivers are updated, and update them or downgrade them if they're already updated."
     if output:
         return output.rstrip("\n")
 
+@rules.rule(facts=['mods'])
 def using_phosphor(mods, minecraft_version):
-    if any("phosphor" in mod for mod in mods):
-        if any("starlight" in mod for mod in mods):
+    if mods.in_category('phosphor'):
+        if mods.in_category('starlight'):
             return '🔴 Phosphor and Starlight are incompatible. You should delete Phosphor from your mods folder.'
         if minecraft_version != '1.12.2':
             output = "🟡 You're using Phosphor. Starlight is much better than Phosphor, you should use it instead. "
@@ -335,42 +598,57 @@ def using_phosphor(mods, minecraft_version):
                 output = "<@695658634436411404> :bug: huh2"
             return output
 
-def failed_to_download_assets(log):
-    if 'Instance update failed because: Failed to download the assets index:' in log:
+@rules.rule(signatures=['Instance update failed because: Failed to download the assets index:'])
+def failed_to_download_assets(signatures):
+    if 'Instance update failed because: Failed to download the assets index:' in signatures:
         return '🔴 Try restarting your PC and then launching the instance again.'
 
-def id_range_exceeded(log):
-    if 'java.lang.RuntimeException: Invalid id 4096 - maximum id range exceeded.' in log:
+@rules.rule(signatures=['java.lang.RuntimeException: Invalid id 4096 - maximum id range exceeded.'])
+def id_range_exceeded(signatures):
+    if 'java.lang.RuntimeException: Invalid id 4096 - maximum id range exceeded.' in signatures:
         return "🔴 You've exceeded the hardcoded ID Limit. Remove some mods, or install [JustEnoughIDs](<https://www.curseforge.com/minecraft/mc-mods/jeid>)"
 
+@rules.rule(facts=['minecraft_folder'], header=True)
 def multimc_in_program_files(minecraft_folder,launcher):
     if minecraft_folder and ('C:/Program Files' in minecraft_folder):
         return '🟡 Your {} installation is in `Program Files`. It is generally not recommended, and could cause issues. Consider moving it to a different location.'.format(launcher if launcher else 'launcher')
 
-def macos_too_new_java(log):
-    if "Terminating app due to uncaught exception 'NSInternalInconsistencyException', reason: 'NSWindow drag regions should only be invalidated on the Main Thread!'" in log:
+@rules.rule(signatures=["Terminating app due to uncaught exception 'NSInternalInconsistencyException', reason: 'NSWindow drag regions should only be invalidated on the Main Thread!'"])
+def macos_too_new_java(signatures):
+    if "Terminating app due to uncaught exception 'NSInternalInconsistencyException', reason: 'NSWindow drag regions should only be invalidated on the Main Thread!'" in signatures:
         return "🔴 You are using too new of a Java version. Please follow the steps on this wiki page to install 8u241: <https://github.com/MultiMC/MultiMC5/wiki/Java-on-macOS>. You don't need to uninstall the other Java version."
 
-def forge_too_new_java(log):
-    if 'java.lang.ClassCastException: class jdk.internal.loader.ClassLoaders$AppClassLoader cannot be cast to class java.net.URLClassLoader' in log:
+@rules.rule(signatures=['java.lang.ClassCastException: class jdk.internal.loader.ClassLoaders$AppClassLoader cannot be cast to class java.net.URLClassLoader'])
+def forge_too_new_java(signatures):
+    if 'java.lang.ClassCastException: class jdk.internal.loader.ClassLoaders$AppClassLoader cannot be cast to class java.net.URLClassLoader' in signatures:
         return "🔴 You need to use Java **8** to use Forge on this Minecraft version. Use this guide to install it, but make sure to install Java **8** instead of Java 17: <https://docs.google.com/document/d/1aPF1lyBAfPWyeHIH80F8JJw8rvvy6lRm0WJ2xxSrRh8/edit#heading=h.62ygxgaxcs5a>."
 
-def m1_failed_to_find_service_port(log):
-    if 'java.lang.IllegalStateException: GLFW error before init: [0x10008]Cocoa: Failed to find service port for display' in log:
+@rules.rule(signatures=['java.lang.IllegalStateException: GLFW error before init: [0x10008]Cocoa: Failed to find service port for display'])
+def m1_failed_to_find_service_port(signatures):
+    if 'java.lang.IllegalStateException: GLFW error before init: [0x10008]Cocoa: Failed to find service port for display' in signatures:
         return "🔴 You seem to be using an Apple M1 Mac with an incompatible version of Forge. Add the following to your launch arguments as a workaround: `-Dfml.earlyprogresswindow=false`"
 
-def pixel_format_not_accelerated_win10(log):
-    if 'org.lwjgl.LWJGLException: Pixel format not accelerated' in log:
+@rules.rule(signatures=['org.lwjgl.LWJGLException: Pixel format not accelerated'])
+def pixel_format_not_accelerated_win10(signatures):
+    if 'org.lwjgl.LWJGLException: Pixel format not accelerated' in signatures:
         return "🔴 You seem to be using an Intel GPU that is not supported on Windows 10. You will need to install an older version of Java, see here for help: <https://github.com/MultiMC/MultiMC5/wiki/Unsupported-Intel-GPUs>."
 
-def shadermod_optifine_conflict(log):
-    if 'java.lang.RuntimeException: Shaders Mod detected. Please remove it, OptiFine has built-in support for shaders.' in log:
+@rules.rule(signatures=['java.lang.RuntimeException: Shaders Mod detected. Please remove it, OptiFine has built-in support for shaders.'])
+def shadermod_optifine_conflict(signatures):
+    if 'java.lang.RuntimeException: Shaders Mod detected. Please remove it, OptiFine has built-in support for shaders.' in signatures:
         return "🔴 You've installed a Shaders Mod alongside OptiFine. OptiFine has built-in shader support, so you should remove Shaders Mod."
 
-def using_system_glfw_or_openal(log,launcher):
-    using_system_libs = [lib for lib in ['GLFW','OpenAL'] if 'Using system '+lib in log]
+@rules.rule(signatures=[
+    'Using system GLFW',
+    'Using system OpenAL',
+], lazy=[
+    'Failed to locate library: glfw',
+    'Failed to locate library: OpenAL',
+])
+def using_system_glfw_or_openal(signatures,launcher):
+    using_system_libs = [lib for lib in ['GLFW','OpenAL'] if 'Using system '+lib in signatures]
     if using_system_libs:
-        if any('Failed to locate library: '+lib in log for lib in ['glfw','OpenAL']):
+        if any('Failed to locate library: '+lib in signatures for lib in ['glfw','OpenAL']):
             output = "🔴 You're using your system's "
             if len(using_system_libs) == 2:
                 output += "GLFW and OpenAL installations"
@@ -386,109 +664,139 @@ def using_system_glfw_or_openal(log,launcher):
             output += ". This can cause the instance to crash if not properly setup. In case of a crash, make sure this isn't the cause of it."
         return output
 
-def sodium_config(log):
-    if 'me.jellysquid.mods.sodium.client' in log:
+@rules.rule(signatures=['me.jellysquid.mods.sodium.client'])
+def sodium_config(signatures):
+    if 'me.jellysquid.mods.sodium.client' in signatures:
         return '🔴 If your game crashes when you open the video settings menu or load into a world, delete `.minecraft/config/sodium-options.json`. <@695658634436411404>'
 
-def using_ssrng(mods,is_multimc_or_fork):
-    if any(mod == "serverSideRNG-9.0.0.jar" for mod in mods):
+@rules.rule(facts=['known_mods'])
+def using_ssrng(known_mods,is_multimc_or_fork):
+    if known_mods.with_issue('server_down'):
         return f"🟡 You are using serverSideRNG. The server for it is currently down, so the mod is useless and it's recommended to {'disable' if is_multimc_or_fork else 'delete'} it."
 
-def random_log_spam_maskers(log):
-    if ('Using missing texture, unable to load' in log
-    or 'Exception loading blockstate definition' in log
-    or 'Unable to load model' in log
-    or 'java.lang.NullPointerException: Cannot invoke "com.mojang.authlib.minecraft.MinecraftProfileTexture.getHash()" because "?" is null' in log):
+@rules.rule(signatures=[
+    'Using missing texture, unable to load',
+    'Exception loading blockstate definition',
+    'Unable to load model',
+    'java.lang.NullPointerException: Cannot invoke "com.mojang.authlib.minecraft.MinecraftProfileTexture.getHash()" because "?" is null',
+])
+def random_log_spam_maskers(signatures):
+    if ('Using missing texture, unable to load' in signatures
+    or 'Exception loading blockstate definition' in signatures
+    or 'Unable to load model' in signatures
+    or 'java.lang.NullPointerException: Cannot invoke "com.mojang.authlib.minecraft.MinecraftProfileTexture.getHash()" because "?" is null' in signatures):
         return "🟢 Your log seems to have lines with random spam. It shouldn't cause any problems, and there aren't any known fixes. <@695658634436411404>"
 
-def need_fapi(log):
-    if 'requires any version of fabric, which is missing!' in log:
+@rules.rule(signatures=['requires any version of fabric, which is missing!'])
+def need_fapi(signatures):
+    if 'requires any version of fabric, which is missing!' in signatures:
         return "🔴 You're using a mod that requires Fabric API. It is a mod that is separate to Fabric loader. You can download it here: <https://modrinth.com/mod/fabric-api>."
 
+@rules.rule(facts=['mods'])
 def dont_need_fapi(mods,mods_type):
-    if (mods_type == 3 and any('fabric-api' in mod for mod in mods)
-    and not any('mcsrranked' in mod for mod in mods)): # will check for it in a different function
+    if (mods_type == 3 and mods.in_category('fabric_api')
+    and not mods.in_category('ranked')): # will check for it in a different function
         return "🟠 You're using Fabric API, which is not allowed for speedrunning. Delete it from your `mods` folder."
 
-def couldnt_extract_native_jar(log):
-    if "Couldn't extract native jar" in log:
+@rules.rule(signatures=["Couldn't extract native jar"])
+def couldnt_extract_native_jar(signatures):
+    if "Couldn't extract native jar" in signatures:
         return '🔴 Another process appears to be locking your native library JARs. To solve this, please reboot your PC.'
 
-def need_to_launch_as_admin(log,launcher):
+# bounded, so a line of nothing but the start of the message isn't searched to its end once
+# for every copy; paths can have quotes in them
+DIRECTORY_NOT_CREATED_PATTERN = re.compile(r'java\.io\.IOException: Directory \'(.{1,1024}?)\' could not be created')
+
+@rules.rule(signatures=["java.io.IOException: Directory '"])
+def need_to_launch_as_admin(log,signatures,launcher):
     # happened in rankedcord: https://discord.com/channels/1056779246728658984/1074385256070791269/1118915678834020372
-    pattern = re.compile(r'java\.io\.IOException: Directory \'(.+?)\' could not be created')
-    if pattern.search(log):
+    if "java.io.IOException: Directory '" not in signatures:
+        return None
+    if DIRECTORY_NOT_CREATED_PATTERN.search(log):
         return f"🟠 Try opening {launcher if launcher else 'the launcher'} as administrator."
 
-def maskers_crash(log):
+# the frames it checks are in the trace of this exception, so only that is scanned for
+@rules.rule(signatures=['net.minecraft.class_148: Feature placement'], lazy=['Encountered an unexpected exception'])
+def maskers_crash(signatures, crashes):
     # https://discord.com/channels/928728732376649768/940285426441281546/1107588481556946998 devcord
-    if ('java.lang.RuntimeException: We are asking a region for a chunk out of bound' in log
-    and 'Encountered an unexpected exception' in log
-    and 'net.minecraft.class_148: Feature placement' in log
-    and 'net.minecraft.server.MinecraftServer.method_3813(MinecraftServer.java:876)' in log
-    and 'at net.minecraft.server.MinecraftServer.method_3748(MinecraftServer.java:813)' in log):
+    if 'Encountered an unexpected exception' not in signatures:
+        return None
+    # all in the same trace, not just somewhere in the log
+    if any(trace.has('java.lang.RuntimeException', 'We are asking a region for a chunk out of bound')
+           and 'net.minecraft.server.MinecraftServer.method_3813(MinecraftServer.java:876)' in trace.frames
+           and 'net.minecraft.server.MinecraftServer.method_3748(MinecraftServer.java:813)' in trace.frames
+           for trace in crashes.find('net.minecraft.class_148', 'Feature placement')):
         return "🟢 This seems to be a rare crash that you can't do anything about. So far we only know of one case when it happened. <@695658634436411404>"
 
-def lithium_crash(log):
+# likewise, the lithium frames are in the trace of this exception
+@rules.rule(signatures=['java.lang.IllegalStateException: Adding Entity listener a second time'])
+def lithium_crash(crashes):
     # known incidents:
     # https://discord.com/channels/928728732376649768/940285426441281546/1077767432812376265 devcord
     # https://discord.com/channels/928728732376649768/940285426441281546/1093051774409121822 devcord
     # https://discord.com/channels/1056779246728658984/1074302943374872637/1119191694563344434 rankedcord
-    if ('java.lang.IllegalStateException: Adding Entity listener a second time' in log
-    and 'me.jellysquid.mods.lithium.common.entity.tracker.nearby' in log):
+    lithium = crashes.in_package('me.jellysquid.mods.lithium.common.entity.tracker.nearby')
+    if any(trace in lithium for trace in crashes.find('java.lang.IllegalStateException', 'Adding Entity listener a second time')):
         return "🟢 This seems to be a rare crash caused by Lithium that you can't do anything about. It happens really rarely, so far we only know about 4 times of when it happened to someone, so it's not worth it to not use Lithium because of it."
 
-def old_arr(mods,minecraft_version):
-    if ('antiresourcereload-1.16.1-1.0.0.jar' in mods) and (minecraft_version == '1.16.1'):
+@rules.rule(facts=['known_mods'])
+def old_arr(known_mods,minecraft_version):
+    if known_mods.with_issue('crashes_in_practice_maps') and (minecraft_version == '1.16.1'):
         return "🔴 You're using an old version of AntiResourceReload, which can cause Minecraft to crash when entering practice maps. You should update it: <https://github.com/Minecraft-Java-Edition-Speedrunning/mcsr-antiresourcereload-1.16.1/releases/tag/latest>"
 
-def limited_graphics_capability(log):
+@rules.rule(signatures=['GLFW error 65543: WGL: OpenGL profile requested but WGL_ARB_create_context_profile is unavailable'])
+def limited_graphics_capability(signatures):
     # happened in javacord:
     # https://discord.com/channels/83066801105145856/727673359860760627/1119184648896000010
-    if 'GLFW error 65543: WGL: OpenGL profile requested but WGL_ARB_create_context_profile is unavailable' in log:
+    if 'GLFW error 65543: WGL: OpenGL profile requested but WGL_ARB_create_context_profile is unavailable' in signatures:
         return """🔴 Your issue stems from using Intel HD2000 integrated graphics, which only supports up to OpenGL 3.1. Unfortunately, there are no dedicated Windows 10 drivers available for this graphics card. As a result, you will not be easily able to run Minecraft 1.17+, as 21w10a and later require improved graphics capabilities beyond OpenGL 3.1. You should still be able to play Minecraft versions 1.16 and earlier.
 For more information about this issue and possible solutions, please refer to the following link: <https://prismlauncher.org/wiki/getting-started/installing-java/#a-note-about-intel-hd-20003000-on-windows-10>"""
 
-def exitcode_1073741819(log):
-    if ('Process crashed with exitcode -1073741819 (0xffffffffc0000005).' in log
-    or 'The instruction at 0x%p referenced memory at 0x%p. The memory could not be %s.' in log):
+@rules.rule(signatures=[
+    'Process crashed with exitcode -1073741819 (0xffffffffc0000005).',
+    'The instruction at 0x%p referenced memory at 0x%p. The memory could not be %s.',
+])
+def exitcode_1073741819(signatures):
+    if ('Process crashed with exitcode -1073741819 (0xffffffffc0000005).' in signatures
+    or 'The instruction at 0x%p referenced memory at 0x%p. The memory could not be %s.' in signatures):
         return '''🔴 Your game crashed with exitcode `-1073741819`. Here are some possible solutions:
 - Check if you have a controller plugged in. If you do, unplug it.
 - Reboot your pc.
 - Some mods may cause this crash for currently unknown reasons. So far, this has happened with Sodium, SleepBackground, and LazyDFU. Try removing these mods/other mods one by one and testing if the game still crashes.
 - Make sure you have the latest graphics driver.'''
 
-def exitcode_805306369_or_old_ssrng(log,mods):
-    pattern = r'^serverSideRNG-[1-8]\.0\.0\.jar$'
-    if any(re.match(pattern, mod) for mod in mods):
+@rules.rule(signatures=[
+    'Process crashed with exitcode -805306369',
+    'java.lang.ArithmeticException: / by zero',
+    '########## GL ERROR ##########',
+], lazy=['@ Render'], facts=['known_mods'])
+def exitcode_805306369_or_old_ssrng(signatures,known_mods):
+    if known_mods.with_issue('illegal'):
         return "🔴 You're using an old version of serverSideRNG, which is now illegal and can often cause problems. The server for it is currently down, so the mod is useless regardless and you should delete it."
-    if ('Process crashed with exitcode -805306369' in log
-    or 'java.lang.ArithmeticException: / by zero' in log
-    or ('########## GL ERROR ##########' in log and '@ Render' in log)):
+    if ('Process crashed with exitcode -805306369' in signatures
+    or 'java.lang.ArithmeticException: / by zero' in signatures
+    or ('########## GL ERROR ##########' in signatures and '@ Render' in signatures)):
         return "🟠 Check your options.txt file for any values that are set to 0 and are not supposed to be 0 (such as `maxFps:0`). If you find any, change them to the values you want and save the file."
 
-def ranked_non_whitelisted_mods(mods,log,is_multimc_or_fork):
-    if not any('mcsrranked' in mod for mod in mods):
+NOT_WHITELISTED_PATTERN = re.compile(r'The Fabric Mod "(.{0,256}?)" is not whitelisted!')
+
+@rules.rule(signatures=['" is not whitelisted!'], facts=['mods'])
+def ranked_non_whitelisted_mods(mods,known_mods,log,signatures,is_multimc_or_fork):
+    if not mods.in_category('ranked'):
         return None
     output = ''
-    whitelisted_mods = ['sodium','replaymod','extra-options','retino','worldpreview',
-                        'sleepbackground','SpeedRunIGT','atum','standardsettings',
-                        'forceport','lazystronghold','antiresourcereload','serverSideRNG',
-                        'BiomeThreadLocalFix','mcsrranked','fast-reset','starlight',
-                        'phosphor','lithium','krypton','dynamic-menu-fps','lazydfu',
-                        'voyager','forceport','FabricProxy-Lite']
-    non_whitelisted_mods = [mod for mod in mods if not any(w_mod in mod for w_mod in whitelisted_mods)]
+    # file names with a whitelisted mod's name in them, or mods.json says they're whitelisted
+    non_whitelisted_mods = [mod for mod in mods.not_in_category('ranked_whitelist') if not known_mods.whitelisted(mod)]
     if non_whitelisted_mods:
-        pattern = r'The Fabric Mod "(.*?)" is not whitelisted!'
-        matches = re.findall(pattern, log)
+        matches = None
+        if '" is not whitelisted!' in signatures:
+            matches = NOT_WHITELISTED_PATTERN.findall(log)
         if matches: # if ranked complains about non-whitelisted mods
             # non_whitelisted_mods_and_libs = list(matches)
-            if any('fabric-api' in mod for mod in non_whitelisted_mods):
+            if any(mod in non_whitelisted_mods for mod in mods.in_category('fabric_api')):
                 output += "🔴 You're using Fabric API. It is a mod separate to Fabric Loader, and it isn't allowed for speedrunning. Delete it from your `mods` folder.\n"
-            practice_mods = ['peepopractice','stronghold-trainer','noverworld','blinded',
-                             'heatshrink','lavapool-juicer','cageless','no-spawnchunks',
-                             'treasure-juicer','no-basalt','shipwreck-juicer','logmod']
-            practice_mods = [nw_mod for nw_mod in non_whitelisted_mods if any(p_mod in nw_mod for p_mod in practice_mods)]
+            practice_mods = set(mods.in_category('practice'))
+            practice_mods = [nw_mod for nw_mod in non_whitelisted_mods if nw_mod in practice_mods]
             if len(non_whitelisted_mods) != len(practice_mods):
                 output += f"🔴 You are using {'mods' if len(non_whitelisted_mods)>1 else 'a mod'} ({', '.join(non_whitelisted_mods)}) that {'is' if len(non_whitelisted_mods)==1 else 'are'}n't whitelisted for MCSR Ranked. Delete {'it' if len(non_whitelisted_mods)==1 else 'them'} from your `mods` folder.\n"
             else:
@@ -502,22 +810,29 @@ def ranked_non_whitelisted_mods(mods,log,is_multimc_or_fork):
             return output
         return "<@695658634436411404> :bug: huh3"
 
-def using_autoreset_instead_of_atum(mods,log):
-    if ('autoreset-1.2.0+MC1.16.1.jar' in mods
-    or 'java.lang.RuntimeException: Non-unique Mixin config name autoreset.mixins.json used by the mods atum and autoreset' in log):
+@rules.rule(signatures=['java.lang.RuntimeException: Non-unique Mixin config name autoreset.mixins.json used by the mods atum and autoreset'], facts=['known_mods'])
+def using_autoreset_instead_of_atum(known_mods,signatures):
+    if (known_mods.with_issue('replaced_by_atum')
+    or 'java.lang.RuntimeException: Non-unique Mixin config name autoreset.mixins.json used by the mods atum and autoreset' in signatures):
         return "🔴 You're using AutoReset. It's a really old mod that is no longer allowed, and Atum is a better version of it. You can download Atum here: <https://modrinth.com/mod/atum/versions>."
 
-def need_to_update_ranked(mods):
-    if 'mcsrranked-1.2.2.jar' in mods:
+@rules.rule(facts=['known_mods'])
+def need_to_update_ranked(known_mods):
+    if known_mods.with_issue('no_longer_works'):
         return "🔴 You're using an old version of the MCSR Ranked mod, which no longer works. You should delete it from your mods folder and download the latest one from <https://modrinth.com/mod/mcsr-ranked/versions/>."
 
-def need_to_launch_online(log):
-    if 'Failed to find Minecraft main class:' in log:
+@rules.rule(signatures=['Failed to find Minecraft main class:'])
+def need_to_launch_online(signatures):
+    if 'Failed to find Minecraft main class:' in signatures:
         return "🔴 You need to launch your instance online at least once for the launcher to download assets."
 
-def javacheck_jar_on_prism(log,minecraft_version,modloader,operating_system):
-    pattern = r'This instance is not compatible with Java version (\d+)\.\nPlease switch to one of the following Java versions for this instance:\nJava version (\d+)'
-    match = re.search(pattern, log)
+JAVACHECK_PATTERN = re.compile(r'This instance is not compatible with Java version (\d+)\.\nPlease switch to one of the following Java versions for this instance:\nJava version (\d+)')
+
+@rules.rule(signatures=['This instance is not compatible with Java version '])
+def javacheck_jar_on_prism(log,signatures,minecraft_version,modloader,operating_system):
+    if 'This instance is not compatible with Java version ' not in signatures:
+        return None
+    match = JAVACHECK_PATTERN.search(log)
     if match:
         switch_java = 0.5
         if modloader == 'forge':
@@ -535,17 +850,22 @@ def javacheck_jar_on_prism(log,minecraft_version,modloader,operating_system):
         return f"🔴 Either use Java {compatible_version} for this instance or disable the Java compatibility check in `Settings > Java` either in instance settings or in global settings."
     return None
 
-def class_not_found_error(log):
+@rules.rule(signatures=['Caused by: java.lang.ClassNotFoundException: org.apache.logging.log4j.spi.AbstractLogger'])
+def class_not_found_error(crashes):
     # happened in mmccord: https://discord.com/channels/132965178051526656/134843027553255425/1120073012906049639
-    if 'Caused by: java.lang.ClassNotFoundException: org.apache.logging.log4j.spi.AbstractLogger' in log:
+    if crashes.root_causes('java.lang.ClassNotFoundException', 'org.apache.logging.log4j.spi.AbstractLogger'):
         return "🔴 Try deleting the folder `.../MultiMC/libraries/org/apache/logging/log4j` and then launching the instance again."
 
-def random_forge_crashes(log):
+@rules.rule(signatures=[
+    'java.lang.RuntimeException: Unable to detect the forge installer!',
+    'java.lang.NoClassDefFoundError: cpw/mods/modlauncher/Launcher',
+])
+def random_forge_crashes(signatures):
     # happens on 1.20.1 with forge 47.0.14 for me on prism
-    if 'java.lang.RuntimeException: Unable to detect the forge installer!' in log:
+    if 'java.lang.RuntimeException: Unable to detect the forge installer!' in signatures:
         return "🔴 Try launching your instance online if you aren't. Also, try using a different version of Forge."
     # happened in prismcord: https://discord.com/channels/1031648380885147709/1098659300651577425
-    if 'java.lang.NoClassDefFoundError: cpw/mods/modlauncher/Launcher' in log:
+    if 'java.lang.NoClassDefFoundError: cpw/mods/modlauncher/Launcher' in signatures:
         return "🔴 Try restarting the launcher, creating an instance without Forge and then installing Forge on this instance."
 
 
@@ -553,61 +873,234 @@ def parse_log(link):
     log = download_from_valid_links(link)
     if log is None:
         return None
-    mods = get_mods_from_log(log)
-    mods_type = get_mods_type(mods)
-    java_version = get_java_version(log)
-    major_java_version = get_major_java_version(java_version)
-    minecraft_folder = get_minecraft_folder(log)
-    operating_system = get_os(minecraft_folder,log)
-    minecraft_version = get_minecraft_version(log)
-    fabric_loader_version = extract_fabric_loader_version(log)
-    launcher = get_launcher(log)
-    is_multimc_or_fork = get_is_multimc_or_fork(launcher)
-    modloader = get_modloader(log)
-    java_arguments = get_java_arguments(log)
-    max_memory_allocation = get_max_memory_allocation(log)
-    issues = [
-        not_using_fabric(modloader,mods_type),
-        should_use_prism(launcher,operating_system),
-        need_java_17_plus_or_64bit_java(log,mods,major_java_version,mods_type,is_multimc_or_fork),
-        outdated_srigt_fabric_01415(mods,fabric_loader_version,minecraft_version),
-        outdated_fabric_loader(fabric_loader_version,mods),
-        not_enough_ram_or_rong_sodium(max_memory_allocation, operating_system, mods, log, java_arguments, mods_type),
-        onedrive(minecraft_folder,launcher),
-        hs_err_pid(log,mods),
-        using_phosphor(mods,minecraft_version),
-        failed_to_download_assets(log),
-        id_range_exceeded(log),
-        multimc_in_program_files(minecraft_folder,launcher),
-        macos_too_new_java(log),
-        forge_too_new_java(log),
-        m1_failed_to_find_service_port(log),
-        pixel_format_not_accelerated_win10(log),
-        shadermod_optifine_conflict(log),
-        using_system_glfw_or_openal(log,launcher),
-        sodium_config(log),
-        using_ssrng(mods,is_multimc_or_fork),
-        random_log_spam_maskers(log),
-        need_fapi(log),
-        dont_need_fapi(mods,mods_type),
-        couldnt_extract_native_jar(log),
-        need_to_launch_as_admin(log,launcher),
-        maskers_crash(log),
-        lithium_crash(log),
-        old_arr(mods,minecraft_version),
-        limited_graphics_capability(log),
-        exitcode_1073741819(log),
-        exitcode_805306369_or_old_ssrng(log,mods),
-        ranked_non_whitelisted_mods(mods,log,is_multimc_or_fork),
-        using_autoreset_instead_of_atum(mods,log),
-        need_to_update_ranked(mods),
-        need_to_launch_online(log),
-        javacheck_jar_on_prism(log,minecraft_version,modloader,operating_system),
-        class_not_found_error(log),
-        random_forge_crashes(log)
-    ]
-    result = []
-    for issue in issues:
-        if issue:
-            result.append(issue)
-    return result
+    return parse_text(log)
+
+def parse_file(path, timings=None, fired=None):
+    # the file is mapped and scanned a chunk at a time, see get_mapped_context
+    with MappedLog(path) as source:
+        return rules.evaluate(get_mapped_context(source, timings), timings, fired)
+
+def parse_text(log, timings=None, fired=None):
+    # with a `timings` dict, seconds spent scanning, reading facts, indexing mods and in each
+    # rule are added to it; with a `fired` list, the names of rules that found something
+    return rules.evaluate(get_context(log, timings), timings, fired)
+
+def parse_header(head, timings=None, fired=None):
+    # only the header rules, for an answer from the start of a log that is still downloading;
+    # what the rest of the log shows (an OutOfMemoryError for the RAM rule) can change it
+    return rules.evaluate(get_context(head, timings), timings, fired, header=True)
+
+def parse_resumable(log, resume=None, timings=None, fired=None):
+    # parse_text that also returns a ResumeState; given the state of an earlier, shorter
+    # version of the same log, only the lines appended since then are scanned
+    context, resume = get_resumed_context(log, resume, timings)
+    return rules.evaluate(context, timings, fired), resume
+
+@dataclass(slots=True)
+class ResumeState:
+    # What parsing the complete lines of a log found, so the same log posted again
+    # with more lines at the end can pick up at `size` bytes instead of starting over.
+    length: int = 0 # characters
+    size: int = 0 # bytes of utf-8
+    digest: bytes = None # sha256 of those bytes
+    signatures: frozenset = frozenset()
+    facts: LogFacts = None
+    header_done: bool = False # Java Arguments: was read, later lines can't change the header facts
+    header_open: bool = False # the last header section doesn't have its empty line yet
+    # for a log that was mostly repeats the first time: the compacted text of those lines,
+    # and the Compactor that made it, still holding back the records that could go on
+    compactor: Compactor = None
+    compacted: str = None
+
+def get_header_state(log, end):
+    # (header_done, header_open) of log[:end]
+    header_open = False
+    for match in HEADER_SECTION_PATTERN.finditer(log, 0, end):
+        header_open = log.find('\n\n', match.end(), end) == -1
+        if header_open or match.group(1) == 'Java Arguments:':
+            return not header_open, header_open
+    return False, False
+
+def get_resumed_context(log, resume=None, timings=None):
+    start = time.perf_counter()
+    data = log.encode('utf-8', 'surrogatepass')
+    digest = hashlib.sha256()
+    if resume is not None:
+        digest.update(memoryview(data)[:resume.size])
+        if len(data) < resume.size or digest.digest() != resume.digest:
+            resume = None
+            digest = hashlib.sha256()
+    resume = resume or ResumeState()
+    # the new state only covers complete lines, the last one may still be growing
+    end = log.rfind('\n') + 1
+    size = len(data) - len(log[end:].encode('utf-8', 'surrogatepass'))
+    digest.update(memoryview(data)[resume.size:size])
+    # whether to compact is decided the first time, like get_context does; the compactor is
+    # copied since the state it came from can be used again
+    values = {}
+    compactor = compacted = None
+    if not resume.length and worth_compacting(log):
+        compactor, compacted = Compactor(), ''
+    elif resume.compactor is not None:
+        compactor, compacted = copy.deepcopy(resume.compactor), resume.compacted
+    compact_seconds = 0
+    context_log = log
+    if compactor is None:
+        new_signatures = rules.scan(log, resume.length, end)
+        signatures = resume.signatures | new_signatures
+        all_signatures = signatures | rules.scan(log, end) if end < len(log) else signatures
+    else:
+        compact_start = time.perf_counter()
+        previous = len(compacted)
+        compacted += compactor.feed(log[resume.length:end])
+        # what's still held back and the unfinished line only go into this parse's text
+        finishing = copy.deepcopy(compactor)
+        context_log = compacted + finishing.feed(log[end:], final=True)
+        compact_seconds = time.perf_counter() - compact_start
+        new_signatures = rules.scan(compacted, previous)
+        signatures = resume.signatures | new_signatures
+        all_signatures = signatures | rules.scan(context_log, len(compacted)) if len(context_log) > len(compacted) else signatures
+    scanned = time.perf_counter()
+    reuse_header = resume.facts is not None and (resume.header_done or not resume.header_open
+                   and not HEADER_SIGNATURES & new_signatures)
+    fabric_loader = None
+    if reuse_header:
+        facts = replace(resume.facts, launcher=get_launcher(log))
+        header_done, header_open = resume.header_done, resume.header_open
+        if not facts.fabric_loader_version and 'with Fabric Loader ' in all_signatures:
+            fabric_loader = FABRIC_LOADER_PATTERN.search(log, resume.length)
+    else:
+        facts = get_log_facts(log, all_signatures)
+        header_done, header_open = get_header_state(log, end) if HEADER_SIGNATURES & signatures else (False, False)
+        if facts.fabric_loader_version:
+            fabric_loader = FABRIC_LOADER_PATTERN.search(log)
+    if fabric_loader:
+        facts.fabric_loader_version = fabric_loader.group(1)
+    # a version on the unfinished last line is looked for again next time
+    resume_facts = facts
+    if fabric_loader and fabric_loader.end() > end:
+        resume_facts = replace(facts, fabric_loader_version=None)
+    resume = ResumeState(end, size, digest.digest(), signatures, resume_facts, header_done, header_open, compactor, compacted)
+    if compactor is not None:
+        values['repeats'] = finishing.repeats
+    context = rules.context(
+        timings,
+        log=context_log,
+        signatures=rules.found(all_signatures, context_log.__contains__),
+        mods=ModIndex(facts.mods),
+        java_version=facts.java_version,
+        minecraft_folder=facts.minecraft_folder,
+        minecraft_version=facts.minecraft_version,
+        fabric_loader_version=facts.fabric_loader_version,
+        launcher=facts.launcher,
+        modloader=facts.modloader,
+        java_arguments=facts.java_arguments,
+        max_memory_allocation=facts.max_memory_allocation,
+        **values,
+    )
+    if timings is not None:
+        timings['compact'] = timings.get('compact', 0) + compact_seconds
+        timings['scan'] = timings.get('scan', 0) + scanned - start - compact_seconds
+        timings['facts'] = timings.get('facts', 0) + time.perf_counter() - scanned
+    return context, resume
+
+def get_context(log, timings=None):
+    # everything the detectors can ask for by parameter name; facts are read from the log
+    # the first time a detector needs them. In logs that are mostly repeats, runs of repeated
+    # lines are cut down to one copy first, so nothing after this walks them again.
+    start = time.perf_counter()
+    log, compactor = compact(log, MIN_SAVING)
+    compacted = time.perf_counter()
+    signatures = rules.found(rules.scan(log), log.__contains__)
+    if timings is not None:
+        timings['compact'] = timings.get('compact', 0) + compacted - start
+        timings['scan'] = timings.get('scan', 0) + time.perf_counter() - compacted
+    if compactor is None:
+        return rules.context(timings, log=log, signatures=signatures)
+    return rules.context(timings, log=log, signatures=signatures, repeats=compactor.repeats)
+
+def scan_mapped(source, compactor=None, spent=None):
+    # {signature: byte offsets of the chunks it is in}; the end of each chunk is scanned
+    # again with the next one, for signatures that span a line break. With a Compactor,
+    # chunks are compacted before they are scanned, and what it still holds back at the
+    # end counts as part of the last chunk; the seconds that took are added to spent['compact'].
+    overlap = max(len(signature) for signature in rules.signatures) - 1
+    found = {}
+    previous = ''
+    chunks = source.chunks()
+    if compactor is not None:
+        chunks = compact_chunks(chunks, compactor, spent if spent is not None else {})
+    for offset, text in chunks:
+        text = previous + text
+        for signature in rules.scan(text):
+            found.setdefault(signature, []).append(offset)
+        previous = text[-overlap:]
+    return found
+
+def compact_chunks(chunks, compactor, spent):
+    offset = 0
+    for offset, text in chunks:
+        start = time.perf_counter()
+        text = compactor.feed(text)
+        spent['compact'] = spent.get('compact', 0) + time.perf_counter() - start
+        yield offset, text
+    start = time.perf_counter()
+    text = compactor.feed('', final=True)
+    spent['compact'] = spent.get('compact', 0) + time.perf_counter() - start
+    yield offset, text
+
+def get_mapped_context(source, timings=None):
+    # get_context for a MappedLog. Only the detectors and facts in LOG_READERS look at the
+    # text itself, and they look for their own signatures, so `log` is just the header and
+    # the chunks those signatures are in. When samples of the file show it's mostly repeats,
+    # chunks are compacted as they are scanned, and the parts read back again.
+    start = time.perf_counter()
+    samples = (source.text(source.boundary(sample_start), source.boundary(sample_end))
+               for sample_start, sample_end in sample_ranges(len(source)))
+    compactor = None
+    if len(source) >= MIN_SIZE and get_saving(samples) >= MIN_SAVING:
+        compactor = Compactor()
+    spent = {'compact': time.perf_counter() - start}
+    found = scan_mapped(source, compactor, spent)
+    signatures = frozenset(found)
+    header = [found[signature][0] for signature in HEADER_SIGNATURES & signatures]
+    # the launcher is on the first line; the header goes on until its last section is closed
+    end = source.boundary(max(header) + 2 * source.chunk_size) if header else source.boundary(1)
+    parts = [source.text(0, end)]
+    while header and end < len(source) and get_header_state(parts[0], len(parts[0]))[1]:
+        end = source.boundary(2 * end)
+        parts = [source.text(0, end)]
+    # chunks with LOG_READERS signatures, and the lines around them for patterns and stack
+    # traces spanning several
+    regions = []
+    for signature in LOG_READERS & signatures:
+        regions += [(source.boundary(max(offset - 64 * 1024, 0)), source.boundary(offset + source.chunk_size + 64 * 1024))
+                    for offset in found[signature]]
+    for region_start, region_end in sorted(regions):
+        if region_end > end:
+            parts.append(source.text(max(region_start, end), region_end))
+            end = region_end
+    log = ''.join(parts)
+    # lazy signatures are looked for in the whole file, which has to stay open until the
+    # detectors are done
+    signatures = rules.found(signatures, lambda signature: any(signature in text for _, text in source.chunks()))
+    if compactor is None:
+        context = rules.context(timings, log=log, signatures=signatures)
+    else:
+        compact_start = time.perf_counter()
+        log = compact(log)[0]
+        spent['compact'] += time.perf_counter() - compact_start
+        context = rules.context(timings, log=log, signatures=signatures, repeats=compactor.repeats)
+    if timings is not None:
+        # scanning and reading the chunks back, without the compacting in between
+        timings['compact'] = timings.get('compact', 0) + spent['compact']
+        timings['scan'] = timings.get('scan', 0) + time.perf_counter() - start - spent['compact']
+    return context
+
+# signatures of the rules and facts that read the log text, besides the header
+LOG_READERS = {'with Fabric Loader '}
+for rule in rules.rules:
+    if {'log', 'sections', 'crashes'} & set(rule.parameters):
+        LOG_READERS.update(rule.signatures)
+
+rules.compile()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from bisect import bisect_left
+
+# seconds; detectors usually take microseconds, downloads up to the timeout
+BUCKETS = (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10)
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # the last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # upper bound of the bucket the q-th observation falls in
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
+
+class Metrics:
+    # Counters and latency histograms, keyed by name and labels, e.g.
+    # metrics.observe('detector_seconds', 0.002, detector='ranked'). render() returns them
+    # in the Prometheus text format.
+    def __init__(self, prefix='background_pingu_'):
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def counter(self, name, **labels):
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def histogram(self, name, **labels):
+        return self.histograms.get((name, tuple(sorted(labels.items()))))
+
+    def by_label(self, name, label):
+        # {label value: histogram} for every histogram called `name`
+        return {dict(labels)[label]: histogram for (key, labels), histogram in self.histograms.items()
+                if key == name and label in dict(labels)}
+
+    def render(self):
+        lines = []
+        typed = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {self.prefix}{name} counter')
+                typed.add(name)
+            lines.append(f'{self.prefix}{name}{format_labels(labels)} {value}')
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            if name not in typed:
+                lines.append(f'# TYPE {self.prefix}{name} histogram')
+                typed.add(name)
+            seen = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                seen += count
+                lines.append(f'{self.prefix}{name}_bucket{format_labels(labels + (("le", bound),))} {seen}')
+            lines.append(f'{self.prefix}{name}_sum{format_labels(labels)} {histogram.sum}')
+            lines.append(f'{self.prefix}{name}_count{format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+async def serve(metrics, port, host='127.0.0.1'):
+    # GET /metrics for Prometheus to scrape, only from this machine unless `host` says otherwise
+    from aiohttp import web
+    async def handle(request):
+        return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
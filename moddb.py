@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# python moddb.py checks mods.json and builds mods.db from it; the bot and batch.py build it
+# on their own when it's missing or out of date.
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from versions import parse_version
+
+# What the detectors know about mods by mod id, the jar name before its version in lowercase:
+# the Java version the mod or some of its versions need and what to do about it on older Java
+# (`java_fix`: update Java, or replace the jar with a version from `url`; otherwise delete it),
+# whether MCSR Ranked allows it and versions with known problems, each with an issue name a
+# detector looks for. It's written by hand in mods.json and built into an SQLite database next
+# to it the first time a log with mods is parsed, and again whenever mods.json changes. A log's
+# mods are looked up in one query and each process keeps what it looked up, so mods.json can
+# grow to thousands of mods without parsing getting slower.
+#
+# A jar whose id isn't in it is looked up by the ids made of runs of its parts, longest first,
+# so renamed jars like setspawnmod-fabric-1.2.jar are still found.
+#
+# A version entry covers the versions from `from` up to `below`, or `version` alone, or all of
+# them when it has none of these; with `minecraft` only jars for that Minecraft version. Its
+# `java` is needed instead of the mod's own if it's higher.
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'mods.json')
+DATABASE_PATH = os.path.splitext(SOURCE_PATH)[0] + '.db'
+FORMAT = 1 # bumped when the tables change, so older databases are rebuilt
+MAX_VARIABLES = 500 # ids per query, SQLite only takes so many parameters
+CACHE_SIZE = 16384 # mod ids each process keeps, known or not
+ID_SEPARATOR_PATTERN = re.compile(r'[-_]')
+
+@dataclass(slots=True)
+class VersionEntry:
+    lowest: tuple = None
+    below: tuple = None
+    exact: tuple = None
+    minecraft: str = None
+    java: int = None
+    issue: str = None
+
+    def covers(self, version, minecraft_version):
+        # `version` parsed, None if the jar's version couldn't be
+        if self.minecraft is not None and self.minecraft != minecraft_version:
+            return False
+        if self.exact is not None:
+            return version == self.exact
+        if self.lowest is None and self.below is None:
+            return True
+        return (version is not None and (self.lowest is None or version >= self.lowest)
+                and (self.below is None or version < self.below))
+
+@dataclass(slots=True)
+class ModMetadata:
+    id: str
+    url: str = None
+    ranked_whitelist: bool = False
+    java: int = None
+    java_fix: str = None
+    versions: list = field(default_factory=list)
+
+    def resolve(self, version, minecraft_version):
+        # (Java version needed, issues) for one jar of this mod
+        java = self.java
+        issues = []
+        version = get_version(version)
+        for entry in self.versions:
+            if entry.covers(version, minecraft_version):
+                if entry.java and entry.java > (java or 0):
+                    java = entry.java
+                if entry.issue:
+                    issues.append(entry.issue)
+        return java, issues
+
+@dataclass(slots=True)
+class KnownMod:
+    filename: str
+    metadata: ModMetadata
+    java: int = None
+    issues: list = field(default_factory=list)
+
+class KnownMods:
+    # The mods of one log that are in the database, by file name in the log's order
+    def __init__(self, known=()):
+        self.known = {mod.filename: mod for mod in known}
+        self.by_issue = {}
+        for mod in self.known.values():
+            for issue in mod.issues:
+                self.by_issue.setdefault(issue, []).append(mod.filename)
+
+    def __len__(self):
+        return len(self.known)
+
+    def __contains__(self, filename):
+        return filename in self.known
+
+    def __getitem__(self, filename):
+        return self.known[filename]
+
+    def with_issue(self, issue):
+        return self.by_issue.get(issue, [])
+
+    def needing_java(self, version):
+        return [filename for filename, mod in self.known.items() if mod.java and mod.java >= version]
+
+    def whitelisted(self, filename):
+        mod = self.known.get(filename)
+        return mod is not None and mod.metadata.ranked_whitelist
+
+class ModDatabase:
+    # Opened on the first lookup in each process that does one, after a fork too
+    def __init__(self, source=SOURCE_PATH, path=DATABASE_PATH):
+        self.source = source
+        self.path = path
+        self.db = None
+        self.pid = None
+        self.cache = {} # mod id -> ModMetadata, None if it isn't in the database
+
+    def lookup(self, mods):
+        # `mods` have a filename, id, version and minecraft_version, like logparsing's ModInfo
+        mods = list(mods)
+        candidates = {mod_id: get_candidates(mod_id) for mod_id in {mod.id.lower() for mod in mods}}
+        wanted = set(candidates).union(*candidates.values())
+        missing = [mod_id for mod_id in wanted if mod_id not in self.cache]
+        if missing:
+            self.fetch(missing)
+        known = []
+        for mod in mods:
+            mod_id = mod.id.lower()
+            metadata = self.cache.get(mod_id)
+            if metadata is None:
+                metadata = next((self.cache[candidate] for candidate in candidates[mod_id]
+                                 if self.cache[candidate] is not None), None)
+            if metadata is not None:
+                known.append(KnownMod(mod.filename, metadata, *metadata.resolve(mod.version, mod.minecraft_version)))
+        return KnownMods(known)
+
+    def fetch(self, ids):
+        if self.db is None or self.pid != os.getpid():
+            self.db = self.connect()
+            self.pid = os.getpid()
+        if len(self.cache) + len(ids) > CACHE_SIZE:
+            self.cache.clear()
+        for start in range(0, len(ids), MAX_VARIABLES):
+            batch = ids[start:start + MAX_VARIABLES]
+            self.cache.update(dict.fromkeys(batch))
+            rows = self.db.execute('SELECT id, url, ranked_whitelist, java, java_fix, versions FROM mods '
+                                   f'WHERE id IN ({",".join("?" * len(batch))})', batch)
+            for row in rows:
+                self.cache[row[0]] = load_metadata(*row)
+
+    def connect(self):
+        # the database if it was built from the current mods.json, otherwise it's built again
+        with open(self.source, 'rb') as file:
+            data = file.read()
+        digest = get_digest(data)
+        uri = Path(self.path).resolve().as_uri() + '?mode=ro'
+        try:
+            db = sqlite3.connect(uri, uri=True)
+            try:
+                if db.execute("SELECT value FROM meta WHERE key = 'digest'").fetchone() == (digest,):
+                    return db
+            except sqlite3.Error:
+                pass
+            db.close()
+        except sqlite3.Error:
+            pass
+        rows = load_source(data)
+        try:
+            build(rows, digest, self.path)
+            return sqlite3.connect(uri, uri=True)
+        except (OSError, sqlite3.Error):
+            # can't write next to mods.json, so every process builds its own in memory
+            db = sqlite3.connect(':memory:')
+            fill(db, rows, digest)
+            return db
+
+@lru_cache(maxsize=CACHE_SIZE)
+def get_candidates(mod_id):
+    # ids a renamed jar's id could be made from: setspawnmod-fabric -> setspawnmod, fabric
+    parts = ID_SEPARATOR_PATTERN.split(mod_id)
+    runs = {'-'.join(parts[start:end]) for start in range(len(parts)) for end in range(start + 1, len(parts) + 1)}
+    runs.discard(mod_id)
+    return tuple(sorted(runs, key=len, reverse=True))
+
+def get_version(text):
+    try:
+        return parse_version(text) if text else None
+    except ValueError:
+        return None
+
+def get_digest(data):
+    return f'{FORMAT}:{hashlib.blake2b(data, digest_size=16).hexdigest()}'
+
+def load_source(data):
+    # mods.json -> rows of the mods table; ValueError for anything the database couldn't use
+    rows = []
+    for mod_id, mod in json.loads(data).items():
+        if mod_id != mod_id.lower():
+            raise ValueError(f'mod id {mod_id!r} should be lowercase')
+        for entry in mod.get('versions', ()):
+            for key in ('from', 'below', 'version'):
+                if key in entry:
+                    parse_version(entry[key])
+            if 'version' in entry and ('from' in entry or 'below' in entry):
+                raise ValueError(f'{mod_id}: a version entry has either version or from/below')
+        if mod.get('java_fix') not in (None, 'update', 'replace'):
+            raise ValueError(f"{mod_id}: java_fix is either 'update' or 'replace'")
+        rows.append((mod_id, mod.get('url'), bool(mod.get('ranked_whitelist')), mod.get('java'), mod.get('java_fix'),
+                     json.dumps(mod.get('versions', []), separators=(',', ':'))))
+    return rows
+
+def load_metadata(mod_id, url, ranked_whitelist, java, java_fix, versions):
+    entries = [VersionEntry(get_version(entry.get('from')), get_version(entry.get('below')),
+                            get_version(entry.get('version')), entry.get('minecraft'), entry.get('java'),
+                            entry.get('issue'))
+               for entry in json.loads(versions)]
+    return ModMetadata(mod_id, url, bool(ranked_whitelist), java, java_fix, entries)
+
+def fill(db, rows, digest):
+    db.execute('CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)')
+    db.execute('CREATE TABLE mods (id TEXT PRIMARY KEY, url TEXT, ranked_whitelist INTEGER, java INTEGER, '
+               'java_fix TEXT, versions TEXT) WITHOUT ROWID')
+    db.executemany('INSERT INTO mods VALUES (?, ?, ?, ?, ?, ?)', rows)
+    db.execute('INSERT INTO meta VALUES (?, ?)', ('digest', digest))
+    db.commit()
+
+def build(rows, digest, path):
+    # written to a temporary file first, so processes building it at once don't get in each
+    # other's way and readers never see half of it
+    temporary = f'{path}.{os.getpid()}.tmp'
+    if os.path.exists(temporary):
+        os.remove(temporary)
+    db = sqlite3.connect(temporary)
+    try:
+        fill(db, rows, digest)
+    finally:
+        db.close()
+    os.replace(temporary, path)
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else SOURCE_PATH
+    with open(source, 'rb') as file:
+        data = file.read()
+    rows = load_source(data)
+    build(rows, get_digest(data), os.path.splitext(source)[0] + '.db')
+    print(f'{len(rows)} mods in {os.path.splitext(source)[0]}.db')
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import asyncio
+import sys
+import time
+import uuid
+from urllib.parse import urlsplit
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from budget import PARSE_BUDGET, BudgetExceeded, run_with_budget
+from cache import LRUCache, content_hash
+from fetcher import FetchError, Fetcher
+from logbuffer import HEAD_SIZE, MAX_DOWNLOAD_SIZE, MAX_LOG_SIZE, TAIL_SIZE
+from logparsing import get_direct_link, parse_header, parse_resumable, parse_text
+
+RESUME_KEY_LENGTH = 4096
+
+def traced_parse(log, resumable=False, resume=None):
+    # runs in the process pool, so timings and fired rules are sent back with the result
+    timings = {}
+    fired = []
+    if resumable:
+        return parse_resumable(log, resume, timings, fired), timings, fired
+    return parse_text(log, timings, fired), timings, fired
+
+class LogPipeline:
+    # Downloads logs with a Fetcher and parses them in a process pool, so neither blocks the
+    # discord.py event loop. At most `concurrency` logs are handled at the same time, and
+    # once `queue_size` more are waiting, submit() waits until there is room again.
+    # With a metrics.Metrics, download, phase and detector latencies are recorded in it.
+    # A link that is already being handled isn't downloaded again, not even by another bot
+    # process sharing the cache's database: that one waits up to `claim_timeout` seconds
+    # for the result to show up in the database instead.
+    # submit(link, preview) also sets the `preview` future to what the launcher header shows,
+    # once it is in and parsed while the rest of a big log is still downloading; it's left
+    # alone when the whole log is in first.
+    # Parsing a log gets `parse_budget` seconds of CPU time in its worker; a log that takes
+    # longer is cut off, reported and answered with nothing.
+    def __init__(self, concurrency=4, parse_workers=2, queue_size=32, download_timeout=5, cache=None,
+                 head_size=HEAD_SIZE, tail_size=TAIL_SIZE, max_download_size=MAX_DOWNLOAD_SIZE, metrics=None,
+                 retries=2, host_limits=None, resume_size=64, claim_timeout=30, claim_poll=0.1, rate_share=1,
+                 parse_budget=PARSE_BUDGET, max_log_size=MAX_LOG_SIZE):
+        self.concurrency = concurrency
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.fetcher = Fetcher(concurrency, download_timeout, retries, host_limits=host_limits, rate_share=rate_share,
+                               head_size=head_size, tail_size=tail_size, max_download_size=max_download_size,
+                               max_log_size=max_log_size)
+        self.queue = None
+        self.executor = None
+        self.cache_executor = None
+        self.workers = []
+        self.cache = cache
+        self.metrics = metrics
+        # the same latest.log is often posted again after the game crashed, then only the
+        # new lines are scanned; keyed by the start of the log, which doesn't change
+        self.resume_states = LRUCache(resume_size) if resume_size else None
+        self.pending = {}
+        self.headers = {} # link being handled -> future of its header findings
+        self.owner = uuid.uuid4().hex
+        self.claim_timeout = claim_timeout
+        self.claim_poll = claim_poll
+        self.parse_budget = parse_budget
+        self.budget_exceeded = 0
+        self.shared_results = 0
+        self.downloads = 0
+        self.download_seconds = 0
+        self.parses = 0
+        self.parse_seconds = 0
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        await self.fetcher.start()
+        self.executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+        self.cache_executor = ThreadPoolExecutor(max_workers=1)
+        self.workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+
+    async def close(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        await self.fetcher.close()
+        # waits for the parse processes to exit, off the loop: a process that exits right after a
+        # shutdown(wait=False) can hang in the pool's own shutdown
+        await asyncio.to_thread(self.executor.shutdown, cancel_futures=True)
+        self.cache_executor.shutdown(wait=False)
+
+    async def submit(self, link, preview=None):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((link, future, preview))
+        return future
+
+    async def analyse(self, link):
+        return await (await self.submit(link))
+
+    async def worker(self):
+        while True:
+            link, future, preview = await self.queue.get()
+            try:
+                result = await self.process(link, preview)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self.queue.task_done()
+
+    async def download(self, direct_link, on_header=None):
+        # the Fetched log, and the cached result for a 304; if that result is gone from the
+        # cache the log is downloaded again unconditionally
+        conditional = self.cache is not None
+        while True:
+            start = time.perf_counter()
+            retried = self.fetcher.retried
+            try:
+                fetched = await self.fetcher.fetch(direct_link, conditional, on_header)
+            except FetchError:
+                if self.metrics:
+                    self.metrics.increment('download_errors_total')
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                self.downloads += 1
+                self.download_seconds += elapsed
+                if self.metrics:
+                    self.metrics.observe('download_seconds', elapsed, host=urlsplit(direct_link).hostname)
+                    self.metrics.increment('download_retries_total', self.fetcher.retried - retried)
+            if fetched is None:
+                return None, None
+            if self.metrics:
+                self.metrics.increment('downloaded_bytes_total', fetched.received)
+                if fetched.truncated:
+                    self.metrics.increment('truncated_logs_total')
+                if fetched.not_modified:
+                    self.metrics.increment('not_modified_total')
+            if not fetched.not_modified:
+                return fetched, None
+            result = await self.cached(self.cache.get_result, fetched.hash)
+            if result is not None:
+                return fetched, result
+            conditional = False
+
+    async def process(self, link, preview=None):
+        direct_link = get_direct_link(link)
+        if direct_link is None:
+            return None
+        # the same link posted in several channels at once is handled once
+        task = self.pending.get(direct_link)
+        if task is None:
+            header = self.headers[direct_link] = asyncio.get_running_loop().create_future()
+            task = self.pending[direct_link] = asyncio.ensure_future(self.process_link(direct_link, header))
+            task.add_done_callback(lambda _: self.forget(direct_link))
+        if preview is not None:
+            self.headers[direct_link].add_done_callback(lambda header: forward(header, preview))
+        return await asyncio.shield(task)
+
+    def forget(self, direct_link):
+        self.pending.pop(direct_link, None)
+        self.headers.pop(direct_link).cancel()
+
+    async def process_link(self, direct_link, header=None):
+        known_hash = None
+        if self.cache:
+            known_hash = await self.cached(self.cache.get_hash, direct_link)
+            if known_hash:
+                result = await self.cached(self.cache.get_result, known_hash)
+                if result is not None:
+                    return result
+            if not await self.cached(self.cache.claim, direct_link, self.owner, self.claim_timeout):
+                result = await self.wait_for_claim(direct_link)
+                if result is not None:
+                    self.shared_results += 1
+                    return result
+        try:
+            return await self.fetch_and_parse(direct_link, known_hash, header)
+        finally:
+            if self.cache:
+                await self.cached(self.cache.release, direct_link, self.owner)
+
+    async def wait_for_claim(self, direct_link):
+        # another process is downloading the link, its result arrives through the database;
+        # None if it gave up or took too long, then the claim is taken over
+        deadline = time.monotonic() + self.claim_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.claim_poll)
+            result = await self.cached(self.cache.shared, direct_link)
+            if result is not None:
+                return result
+            if await self.cached(self.cache.claim, direct_link, self.owner, self.claim_timeout):
+                return None
+        return None
+
+    async def fetch_and_parse(self, direct_link, known_hash, header=None):
+        previews = []
+        on_header = None
+        if header is not None:
+            on_header = lambda text: header.done() or previews.append(asyncio.ensure_future(self.preview(text, header)))
+        try:
+            fetched, result = await self.download(direct_link, on_header)
+        finally:
+            # a preview that isn't ready by the time the whole log is in isn't needed anymore
+            for task in previews:
+                task.cancel()
+        if fetched is None:
+            return None
+        log, log_hash = fetched.text, fetched.hash
+        if self.cache and result is None:
+            log_hash = log_hash or content_hash(log)
+            if log_hash != known_hash:
+                result = await self.cached(self.cache.get_result, log_hash)
+        if result is None:
+            start = time.perf_counter()
+            result = await self.parse(log, fetched.truncated)
+            self.parses += 1
+            self.parse_seconds += time.perf_counter() - start
+        if self.cache:
+            await self.cached(self.cache.set, direct_link, log_hash, result)
+        return result
+
+    async def cached(self, method, *args):
+        # a cache with a database is used from a thread of its own, as its queries can wait on
+        # the disk or on another process's write, and the event loop must never wait with them
+        if self.cache.db is None:
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.cache_executor, method, *args)
+
+    async def preview(self, head, header):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(self.executor, run_with_budget, self.parse_budget, parse_header, head)
+        except Exception:
+            return # the full parse runs into it too, and reports it
+        if self.metrics:
+            self.metrics.observe('preview_seconds', time.perf_counter() - start)
+        if not header.done():
+            header.set_result(result)
+
+    async def parse(self, log, truncated):
+        loop = asyncio.get_running_loop()
+        # a truncated log is missing its middle, so it can't be the start of a longer one
+        resume_key = content_hash(log[:RESUME_KEY_LENGTH]) if self.resume_states is not None and not truncated else None
+        resume = self.resume_states.get(resume_key) if resume_key else None
+        try:
+            if self.metrics:
+                result, timings, fired = await loop.run_in_executor(self.executor, run_with_budget, self.parse_budget,
+                                                                    traced_parse, log, resume_key is not None, resume)
+                self.record_parse(timings, fired)
+            elif resume_key:
+                result = await loop.run_in_executor(self.executor, run_with_budget, self.parse_budget, parse_resumable, log, resume)
+            else:
+                result = await loop.run_in_executor(self.executor, run_with_budget, self.parse_budget, parse_text, log)
+        except BudgetExceeded as error:
+            # most likely made to make a pattern backtrack; the empty result is cached, so
+            # posting it again costs nothing
+            self.budget_exceeded += 1
+            if self.metrics:
+                self.metrics.increment('parse_budget_exceeded_total')
+            print(f'parse cut off: {error}', file=sys.stderr)
+            return []
+        if resume_key:
+            result, resume = result
+            self.resume_states.set(resume_key, resume)
+        return result
+
+    def record_parse(self, timings, fired):
+        for phase in ('compact', 'scan', 'facts'):
+            self.metrics.observe('phase_seconds', timings.pop(phase, 0), phase=phase)
+        for name, seconds in timings.items():
+            self.metrics.observe('detector_seconds', seconds, detector=name)
+        for name in fired:
+            self.metrics.increment('detector_fired_total', detector=name)
+
+    def stats(self):
+        stats = {
+            'downloads': self.downloads,
+            'download_seconds': self.download_seconds,
+            'parses': self.parses,
+            'parse_seconds': self.parse_seconds,
+            'shared_results': self.shared_results,
+            'budget_exceeded': self.budget_exceeded,
+        }
+        if self.cache:
+            stats.update(self.cache.stats())
+            # a link hit skips the download, a result hit skips the parsing
+            average_download = self.download_seconds / self.downloads if self.downloads else 0
+            average_parse = self.parse_seconds / self.parses if self.parses else 0
+            stats['saved_seconds'] = stats['link_hits'] * average_download + stats['result_hits'] * average_parse
+        return stats
+
+def forward(header, preview):
+    if not header.cancelled() and not preview.done():
+        preview.set_result(header.result())
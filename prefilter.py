@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import re
+from decompress import COMPRESSED_CONTENT_TYPES, COMPRESSED_EXTENSIONS
+
+# Every message the bot can see goes through here, so chat and image uploads should be
+# turned away before anything is downloaded or even matched with a regex
+# links to .log.gz and the like count too
+LINK_PATTERN = re.compile(r'https:\/\/paste\.ee\/p\/\w+|https:\/\/mclo\.gs\/\w+|https?:\/\/[\w\/.]+\.(?:txt|log|'
+                          + '|'.join(extension[1:] for extension in COMPRESSED_EXTENSIONS) + ')')
+# gzipped old logs, zipped crash reports and zstd files (with zstandard installed) are
+# decompressed while they download
+LOG_EXTENSIONS = ('.txt', '.log') + COMPRESSED_EXTENSIONS
+# Discord sends these for log uploads; no content type means it wasn't detected
+LOG_CONTENT_TYPES = ('text/', 'application/octet-stream') + COMPRESSED_CONTENT_TYPES
+
+def find_links(content):
+    # LINK_PATTERN can't match without a ://, and most chat has none
+    if '://' not in content:
+        return []
+    return LINK_PATTERN.findall(content)
+
+class MessageFilter:
+    # Picks the links and attachments in a message that could be logs. With `channels`, only
+    # messages in those channels (or threads in them) are looked at. Attachments are judged
+    # by their name, content type and size, without downloading them.
+    def __init__(self, channels=(), max_attachment_size=100*1024*1024):
+        self.channels = set(channels)
+        self.max_attachment_size = max_attachment_size
+        self.messages = 0
+        self.skipped = 0
+
+    def allowed(self, channel):
+        if not self.channels:
+            return True
+        return channel.id in self.channels or getattr(channel, 'parent_id', None) in self.channels
+
+    def is_log(self, attachment):
+        if not attachment.filename.lower().endswith(LOG_EXTENSIONS):
+            return False
+        if attachment.content_type and not attachment.content_type.startswith(LOG_CONTENT_TYPES):
+            return False
+        return 0 < attachment.size <= self.max_attachment_size
+
+    def links(self, message):
+        self.messages += 1
+        if self.channels and not self.allowed(message.channel):
+            self.skipped += 1
+            return []
+        links = find_links(message.content)
+        if message.attachments:
+            links += [attachment.url for attachment in message.attachments if self.is_log(attachment)]
+        if not links:
+            self.skipped += 1
+        return links
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import inspect
+import time
+from dataclasses import dataclass
+from signatures import Signatures, SignatureScanner
+
+@dataclass(slots=True, eq=False)
+class Rule:
+    name: str
+    func: object
+    parameters: tuple
+    signatures: tuple = ()
+    facts: tuple = ()
+    order: int = 0
+    header: bool = False
+
+class Context(dict):
+    # The values detectors get as arguments. Anything not given up front is computed by
+    # the fact registered under that name the first time it's asked for, then kept.
+    def __init__(self, ruleset, timings=None, **values):
+        super().__init__(values)
+        self.ruleset = ruleset
+        self.timings = timings
+        self.depth = 0
+
+    def __missing__(self, name):
+        fact = self.ruleset.providers[name]
+        start = time.perf_counter()
+        self.depth += 1
+        try:
+            value = fact.func(**{parameter: self[parameter] for parameter in fact.parameters})
+        finally:
+            self.depth -= 1
+        # facts needed by other facts are already counted in the outer one
+        if self.timings is not None and not self.depth:
+            self.timings['facts'] = self.timings.get('facts', 0) + time.perf_counter() - start
+        self[name] = value
+        return value
+
+    def get(self, name, default=None):
+        if name in self or name in self.ruleset.providers:
+            return self[name]
+        return default
+
+class RuleSet:
+    # Detectors register with @rules.rule(signatures=..., facts=...). `signatures` are the
+    # literal strings the detector looks for in the log and `facts` the values it needs
+    # (context keys like 'mods' or 'minecraft_folder'). A rule only runs when one of its
+    # signatures is in the log or one of its facts is set; rules that declare neither
+    # always run. Detectors get their arguments from the context by parameter name, and
+    # @rules.fact(name) registers how to compute a context value the first time it's needed.
+    # Rules registered with header=True only need the launcher header at the start of the log,
+    # evaluate(..., header=True) runs just those. `lazy` signatures are ones a detector only
+    # checks once one of its other signatures is found, like '@ Render' after a GL ERROR: they
+    # don't make the rule run and are only looked for in logs where a detector asks, which
+    # saves a pass over every other log. They can't span lines.
+    def __init__(self):
+        self.rules = []
+        self.providers = {}
+        self.always = []
+        self.by_signature = {}
+        self.by_fact = {}
+        self.extra_signatures = []
+        self.lazy = set()
+        self.scanner = None
+
+    def rule(self, signatures=(), facts=(), header=False, lazy=()):
+        def register(func):
+            rule = Rule(func.__name__, func, tuple(inspect.signature(func).parameters),
+                        tuple(signatures), tuple(facts), len(self.rules), header)
+            self.rules.append(rule)
+            if not rule.signatures and not rule.facts:
+                self.always.append(rule)
+            for signature in rule.signatures:
+                self.by_signature.setdefault(signature, []).append(rule)
+            for fact in rule.facts:
+                self.by_fact.setdefault(fact, []).append(rule)
+            self.lazy.update(lazy)
+            self.scanner = None
+            return func
+        return register
+
+    def fact(self, name):
+        def register(func):
+            self.providers[name] = Rule(name, func, tuple(inspect.signature(func).parameters))
+            return func
+        return register
+
+    def context(self, timings=None, **values):
+        return Context(self, timings, **values)
+
+    def found(self, signatures, find):
+        # what detectors get as `signatures`: the ones scanned for, and the lazy ones through
+        # find(signature)
+        return Signatures(signatures, frozenset(self.lazy), find)
+
+    def add_signatures(self, *signatures):
+        # strings looked for outside of rules, so they are scanned for together with the rest
+        self.extra_signatures += signatures
+        self.scanner = None
+
+    @property
+    def signatures(self):
+        return tuple(dict.fromkeys(self.extra_signatures + list(self.by_signature)))
+
+    def compile(self):
+        self.scanner = SignatureScanner(self.signatures)
+
+    def scan(self, log, start=0, end=None):
+        # signatures in log[start:end], counting ones that begin before `start` and end after it
+        if self.scanner is None:
+            self.compile()
+        if start or end is not None:
+            log = log[max(start - self.scanner.max_length + 1, 0):end]
+        return self.scanner.scan(log)
+
+    def relevant(self, context, header=False):
+        if header:
+            return [rule for rule in self.relevant(context) if rule.header]
+        rules = set(self.always)
+        for signature in context['signatures']:
+            rules.update(self.by_signature.get(signature, ()))
+        for fact, fact_rules in self.by_fact.items():
+            # facts are only computed when they could still add a rule
+            if not rules.issuperset(fact_rules) and context.get(fact):
+                rules.update(fact_rules)
+        return sorted(rules, key=lambda rule: rule.order)
+
+    def evaluate(self, context, timings=None, fired=None, header=False):
+        # with a `timings` dict, the seconds spent in each rule are added to it by rule name,
+        # with a `fired` list, the names of the rules that returned something are appended
+        results = []
+        for rule in self.relevant(context, header):
+            arguments = {parameter: context[parameter] for parameter in rule.parameters}
+            if timings is None:
+                result = rule.func(**arguments)
+            else:
+                start = time.perf_counter()
+                result = rule.func(**arguments)
+                timings[rule.name] = timings.get(rule.name, 0) + time.perf_counter() - start
+            if result:
+                results.append(result)
+                if fired is not None:
+                    fired.append(rule.name)
+        return results
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Run the bot as several processes, each connecting its own share of the Discord shards:
+# python shards.py --processes 4 --shards 8
+# They share one SQLite result cache, so a log posted in guilds on different shards is only
+# downloaded and parsed once, and they split the paste sites' rate limits between them.
+# Each process gets its own metrics port, counting up from metrics_port.
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from dotenv import load_dotenv
+
+def split_shards(shard_count, processes):
+    # shard ids for each process, spread round robin
+    return [list(range(index, shard_count, processes)) for index in range(processes)]
+
+def shard_for(guild_id, shard_count):
+    # the shard Discord sends a guild's events to
+    return (guild_id >> 22) % shard_count
+
+def start(index, shard_ids, shard_count, processes, cache_path):
+    env = dict(os.environ, shard_count=str(shard_count), shard_ids=','.join(map(str, shard_ids)),
+               shard_processes=str(processes), cache_path=cache_path)
+    if int(os.getenv('metrics_port', 0)):
+        env['metrics_port'] = str(int(os.getenv('metrics_port')) + index)
+    print(f'process {index}: shards {shard_ids}', file=sys.stderr)
+    return subprocess.Popen([sys.executable, 'bot.py'], env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='Run the bot as several sharded processes.')
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    parser.add_argument('--shards', type=int, help='total shards, defaults to one per process')
+    parser.add_argument('--restart-delay', type=float, default=5, help='seconds before a crashed process is started again')
+    args = parser.parse_args()
+    shard_count = args.shards or args.processes
+    if shard_count < args.processes:
+        parser.error('need at least one shard per process')
+    cache_path = os.getenv('cache_path') or 'cache.sqlite3'
+    groups = split_shards(shard_count, args.processes)
+    processes = [start(index, shard_ids, shard_count, args.processes, cache_path) for index, shard_ids in enumerate(groups)]
+    try:
+        while True:
+            time.sleep(1)
+            for index, process in enumerate(processes):
+                if process.poll() is not None:
+                    print(f'process {index} exited with {process.returncode}, restarting', file=sys.stderr)
+                    time.sleep(args.restart_delay)
+                    processes[index] = start(index, groups[index], shard_count, args.processes, cache_path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+class SignatureScanner:
+    # Matches a fixed set of literal needles against a log and returns the ones that occur.
+    # Every unique needle is looked up once with `in`, which in CPython is faster than one big
+    # `re` alternation (the regex engine tries each branch at every position). That slows down
+    # about 2x on text that isn't all ASCII, which CPython stores with 2 or 4 bytes a character
+    # (a MultiMC mod list with ✔ in it is enough), so such text is encoded to UTF-8 once and
+    # searched as bytes: a needle is in the text exactly when its UTF-8 is in the text's.
+    def __init__(self, needles):
+        self.needles = tuple(dict.fromkeys(needles))
+        self.encoded = tuple((needle.encode('utf-8', 'surrogatepass'), needle) for needle in self.needles)
+        self.max_length = max((len(needle) for needle in self.needles), default=0)
+
+    def scan(self, text):
+        if text.isascii():
+            return frozenset(needle for needle in self.needles if needle in text)
+        data = text.encode('utf-8', 'surrogatepass')
+        return frozenset(needle for encoded, needle in self.encoded if encoded in data)
+
+class Signatures(frozenset):
+    # The signatures found in a log. Lazy ones aren't scanned for with the rest; the first
+    # time a detector asks for one, `find(signature)` looks it up in the log.
+    __slots__ = ('lazy', 'find', 'looked_up')
+
+    def __new__(cls, found=(), lazy=frozenset(), find=None):
+        self = super().__new__(cls, found)
+        self.lazy = lazy
+        self.find = find
+        self.looked_up = {}
+        return self
+
+    def __contains__(self, signature):
+        if frozenset.__contains__(self, signature):
+            return True
+        if self.find is None or signature not in self.lazy:
+            return False
+        if signature not in self.looked_up:
+            self.looked_up[signature] = self.find(signature)
+        return self.looked_up[signature]
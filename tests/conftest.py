@@ -0,0 +1,8 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+
+# the bot's modules are flat files next to tests/, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
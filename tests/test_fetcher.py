@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# The Fetcher against a stub server on localhost that fails, limits and times out.
+
+import asyncio
+import time
+from aiohttp import web
+from benchmark import generate_log
+from fetcher import Fetcher, FetchError
+
+LOG = generate_log(64 * 1024)
+
+class StubServer:
+    # Serves LOG at /<name>, after failing the way the name says. Counts the requests for
+    # each name and keeps the last If-None-Match it was sent.
+    def __init__(self):
+        self.hits = {}
+        self.seen = {}
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request):
+        name = request.match_info['name']
+        self.hits[name] = count = self.hits.get(name, 0) + 1
+        self.seen[name] = request.headers.get('If-None-Match')
+        if name == 'flaky' and count < 3:
+            return web.Response(status=503)
+        if name == 'down':
+            return web.Response(status=502)
+        if name == 'limited' and count < 2:
+            return web.Response(status=429, headers={'Retry-After': '0.5'})
+        if name == 'slow' and count < 2 or name == 'stuck':
+            await asyncio.sleep(2)
+        if name == 'tagged' and request.headers.get('If-None-Match') == '"v1"':
+            return web.Response(status=304)
+        if name == 'gone':
+            return web.Response(status=404)
+        return web.Response(text=LOG, headers={'ETag': '"v1"'} if name == 'tagged' else {})
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_get('/{name}', self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.url = f'http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/'
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.runner.cleanup()
+
+def fetch(*names):
+    # fetches the names one after another: the server, and (Fetched or FetchError, seconds)
+    # for each; the backoff is much shorter than Retry-After, so waiting for that shows
+    async def run():
+        async with StubServer() as server:
+            fetcher = Fetcher(timeout=0.5, retries=2, backoff=0.01, host_limits={'127.0.0.1': (10000, 10000)})
+            await fetcher.start()
+            results = []
+            try:
+                for name in names:
+                    start = time.perf_counter()
+                    try:
+                        fetched = await fetcher.fetch(server.url + name)
+                    except FetchError as error:
+                        fetched = error
+                    results.append((fetched, time.perf_counter() - start))
+            finally:
+                await fetcher.close()
+            return server, results
+    return asyncio.run(run())
+
+def test_retry_on_5xx():
+    server, [(fetched, _)] = fetch('flaky')
+    assert fetched.text == LOG
+    assert server.hits['flaky'] == 3
+
+def test_give_up_on_5xx():
+    server, [(fetched, _)] = fetch('down')
+    assert isinstance(fetched, FetchError)
+    assert server.hits['down'] == 3
+
+def test_no_retry_on_404():
+    server, [(fetched, _)] = fetch('gone')
+    assert fetched is None
+    assert server.hits['gone'] == 1
+
+def test_wait_for_retry_after():
+    _, [(fetched, seconds)] = fetch('limited')
+    assert fetched.text == LOG
+    assert seconds >= 0.5
+
+def test_retry_on_timeout():
+    server, [(fetched, _)] = fetch('slow')
+    assert fetched.text == LOG
+    assert server.hits['slow'] == 2
+
+def test_give_up_on_timeouts():
+    server, [(fetched, _)] = fetch('stuck')
+    assert isinstance(fetched, FetchError)
+    assert server.hits['stuck'] == 3
+
+def test_not_modified():
+    server, [(first, _), (again, _)] = fetch('tagged', 'tagged')
+    assert server.seen['tagged'] == '"v1"'
+    assert again.not_modified
+    assert again.hash == first.hash
+
+def test_host_rate_limit(rate=20, burst=5, requests=25):
+    async def run():
+        async with StubServer() as server:
+            fetcher = Fetcher(host_limits={'127.0.0.1': (rate, burst)})
+            await fetcher.start()
+            start = time.perf_counter()
+            try:
+                await asyncio.gather(*[fetcher.fetch(server.url + f'log{index}') for index in range(requests)])
+            finally:
+                await fetcher.close()
+            return time.perf_counter() - start
+    # the first `burst` go at once, the rest at `rate` a second
+    assert asyncio.run(run()) >= (requests - burst) / rate * 0.9
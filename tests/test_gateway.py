@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import asyncio
+from benchmark import run_gateway
+
+def test_processes_share_results(processes=2, messages=120, logs=12):
+    # sharded bot processes sharing one cache answer every message and download each log
+    # about once; a claim freed just after another process missed the cache can repeat one
+    row = asyncio.run(run_gateway(processes, messages, logs, 64 * 1024, parse_workers=1))
+    assert row['messages'] == messages
+    assert row['errors'] == 0
+    assert row['distinct_logs'] == logs
+    assert row['downloads'] - row['distinct_logs'] <= processes
+    assert row['parses'] <= row['downloads']
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Every pattern fed input made to make it backtrack, at two lengths: a linear pattern takes
+# about GROWTH times as long on the longer one.
+
+import re
+import pytest
+import compact as compact_module
+import crashes
+import logbuffer
+import logparsing
+import prefilter
+import versions
+from benchmark import best_time
+from budget import BudgetExceeded, cpu_budget
+
+SIZE = 2048 # characters in the shorter input
+GROWTH = 4 # how many times longer the longer input is
+SLACK = 2 # allowed slowdown beyond linear
+
+try:
+    from re import _compiler as sre_compile, _parser as sre_parse
+except ImportError: # before 3.11
+    import sre_compile, sre_parse
+
+# Modules whose *_PATTERN regexes get fed adversarial input
+PATTERN_MODULES = (logparsing, crashes, compact_module, versions, prefilter, logbuffer)
+# patterns only ever used with match() or fullmatch() on one line or file name; the others
+# are searched through a whole log, and timed that way
+MATCHED = {
+    'MOD_LEADING_MINECRAFT_VERSION_PATTERN': 'match',
+    'MOD_TRAILING_MINECRAFT_VERSION_PATTERN': 'match',
+    'MOD_FILENAME_PATTERN': 'match',
+    'EXCEPTION_PATTERN': 'match',
+    'FRAMES_PATTERN': 'match',
+    'VERSION_PATTERN': 'fullmatch',
+}
+# characters tried wherever a pattern takes a class of them
+PROBES = 'a0 \n\t.-_:/\\[]()"\'+!$✔'
+REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) + ((sre_parse.POSSESSIVE_REPEAT,) if hasattr(sre_parse, 'POSSESSIVE_REPEAT') else ())
+SINGLE_CHARACTERS = (sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.IN, sre_parse.CATEGORY)
+
+def find_patterns():
+    return {name: value for module in PATTERN_MODULES for name, value in vars(module).items()
+            if name.endswith('PATTERN') and isinstance(value, re.Pattern)}
+
+def accepted(node, state):
+    # the PROBES a pattern node that matches one character takes
+    pattern = sre_compile.compile(sre_parse.SubPattern(state, [node]))
+    return [char for char in PROBES if pattern.fullmatch(char)]
+
+def walk(items, state, prefix, pumps):
+    # text that roughly matches the parsed `items`; for every repeat, the text before it
+    # and one iteration of it are added to `pumps`
+    text = ''
+    for op, value in items:
+        if op is sre_parse.LITERAL:
+            text += chr(value)
+        elif op in SINGLE_CHARACTERS:
+            text += (accepted((op, value), state) or ['a'])[0]
+        elif op is sre_parse.SUBPATTERN:
+            text += walk(value[-1], state, prefix + text, pumps)
+        elif op is sre_parse.BRANCH:
+            texts = [walk(branch, state, prefix + text, pumps) for branch in value[1]]
+            text += texts[0]
+        elif op in REPEATS:
+            low, high, body = value
+            once = walk(body, state, prefix + text, pumps)
+            pumps.append((prefix + text, once))
+            text += once * max(low, 1 if high else 0)
+        elif op is getattr(sre_parse, 'ATOMIC_GROUP', None):
+            text += walk(value, state, prefix + text, pumps)
+    return text
+
+def get_attacks(pattern):
+    # (head, pump, tail) for inputs that make patterns with nested or overlapping repeats
+    # backtrack: each repeat pumped with what it takes and ended with every way it could fail
+    # to match, and whatever comes before a repeat over and over
+    parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    pumps = []
+    example = walk(list(parsed), parsed.state, '', pumps)
+    attacks = {('', char, '') for char in PROBES}
+    if example:
+        attacks.add(('', example, ''))
+    for prefix, once in pumps:
+        for pump in {once or 'a', *(char for char in PROBES if char in once)}:
+            for tail in ('', '!', '\n', '\x00', ']'):
+                attacks.add((prefix, pump, tail))
+        if prefix:
+            attacks.add(('', prefix, ''))
+            attacks.add(('', prefix + (once or 'a'), ''))
+    return sorted(attacks)
+
+def build_attack(attack, size):
+    head, pump, tail = attack
+    return head + pump * max(size // len(pump), 1) + tail
+
+def time_pattern(pattern, text, method, repeat=3, budget=1):
+    # fastest of `repeat` runs, or None if one took more than `budget` CPU seconds
+    if method == 'finditer':
+        apply = lambda: sum(1 for _ in pattern.finditer(text))
+    else:
+        apply = lambda: getattr(pattern, method)(text)
+    try:
+        with cpu_budget(budget):
+            return best_time(apply, repeat=repeat)
+    except BudgetExceeded:
+        return None
+
+def attack_ratio(pattern, attack, method, size, growth, repeat=3, min_seconds=0.002):
+    # the time on an attack `growth` times as long over the time on one of `size` characters;
+    # inf when either runs out of budget, None when the longer one is too fast to tell
+    small = time_pattern(pattern, build_attack(attack, size), method, repeat)
+    large = time_pattern(pattern, build_attack(attack, size * growth), method, repeat) if small is not None else None
+    if large is None:
+        return float('inf')
+    if large < min_seconds:
+        return None
+    return large / max(small, 1e-7)
+
+def check_pattern(pattern, method, size, growth=4):
+    # (worst ratio over all attacks, that attack); linear patterns stay around `growth`
+    worst = (0, None)
+    for attack in get_attacks(pattern):
+        ratio = attack_ratio(pattern, attack, method, size, growth)
+        if ratio == float('inf'):
+            return ratio, attack
+        if ratio is not None and ratio > worst[0]:
+            worst = (ratio, attack)
+    return worst
+
+@pytest.mark.parametrize('name, pattern', sorted(find_patterns().items()))
+def test_linear_time(name, pattern):
+    method = MATCHED.get(name, 'finditer')
+    ratio, attack = check_pattern(pattern, method, SIZE, GROWTH)
+    if GROWTH * SLACK < ratio < float('inf'):
+        # a hiccup on a busy machine can look super-linear too, so the worst attack is timed
+        # again with more runs before it counts
+        ratio = attack_ratio(pattern, attack, method, SIZE, GROWTH, repeat=9) or 0
+    assert ratio <= GROWTH * SLACK, f'super-linear on {attack!r}'
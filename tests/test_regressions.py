@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+import logparsing
+from benchmark import CRASH_REPORT_HEADER, HEADER, HS_ERR_HEADER
+
+# logs that once got the wrong answer: (name, log, rules that have to fire, rules that must not)
+JAVA_8_HEADER = HEADER.replace('Java is version 17.0.6', 'Java is version 1.8.0_351')
+REGRESSIONS = [
+    ('worldpreview 3.x works on Java 8', JAVA_8_HEADER, (), ('need_java_17_plus_or_64bit_java',)),
+    ('worldpreview 2.x needs Java 17', JAVA_8_HEADER.replace('worldpreview-3.4.1+1.16.1.jar', 'worldpreview-2.3+1.16.1.jar'),
+     ('need_java_17_plus_or_64bit_java',), ()),
+    # renamed jars are still found by the mods.json id in their name, like the old keyword match
+    ('renamed setspawnmod needs Java 17', JAVA_8_HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'setspawnmod-fabric-1.2.jar'),
+     ('need_java_17_plus_or_64bit_java',), ()),
+    ('renamed antiresourcereload needs Java 17',
+     JAVA_8_HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'antiresourcereload-fabric-3.0.0.jar'),
+     ('need_java_17_plus_or_64bit_java',), ()),
+    ('prefixed setspawnmod needs Java 17', JAVA_8_HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'mcsr-setspawnmod-1.2.jar'),
+     ('need_java_17_plus_or_64bit_java',), ()),
+    ('unrelated mod on Java 8', JAVA_8_HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'setspawn-1.0.jar'),
+     (), ('need_java_17_plus_or_64bit_java',)),
+    # mods.json version ranges, wider than the exact file names matched before
+    ('serverSideRNG 9.0.0 server is down', HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'serverSideRNG-9.0.0.jar'),
+     ('using_ssrng',), ('exitcode_805306369_or_old_ssrng',)),
+    ('serverSideRNG 9.0.1 server is down', HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'serverSideRNG-9.0.1.jar'),
+     ('using_ssrng',), ()),
+    ('serverSideRNG 10.0.0 server is down', HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'serverSideRNG-10.0.0.jar'),
+     ('using_ssrng',), ()),
+    ('serverSideRNG 8.0.0 is illegal', HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'serverSideRNG-8.0.0.jar'),
+     ('exitcode_805306369_or_old_ssrng',), ('using_ssrng',)),
+    ('autoreset 1.2.0 is replaced by atum', HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'autoreset-1.2.0+MC1.16.1.jar'),
+     ('using_autoreset_instead_of_atum',), ()),
+    ('autoreset 1.3 is replaced by atum', HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'autoreset-1.3.jar'),
+     ('using_autoreset_instead_of_atum',), ()),
+    ('mcsrranked 1.2.2 no longer works', HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'mcsrranked-1.2.2.jar'),
+     ('need_to_update_ranked',), ()),
+    ('mcsrranked 1.2.2+1.16.1 no longer works', HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'mcsrranked-1.2.2+1.16.1.jar'),
+     ('need_to_update_ranked',), ()),
+    ('mcsrranked 1.3 works', HEADER.replace('lazystronghold-1.1.2+1.16.1.jar', 'mcsrranked-1.3.jar'),
+     (), ('need_to_update_ranked',)),
+    ('hs_err block after a crash report cut off without its end',
+     HEADER + CRASH_REPORT_HEADER + HS_ERR_HEADER.replace('EXCEPTION_ACCESS_VIOLATION (0xc0000005)', 'SIGSEGV (0xb)'),
+     ('hs_err_pid',), ()),
+]
+
+@pytest.mark.parametrize('method', ['parse_text', 'parse_resumable'])
+@pytest.mark.parametrize('name, log, fire, quiet', REGRESSIONS, ids=[regression[0] for regression in REGRESSIONS])
+def test_regression(name, log, fire, quiet, method):
+    # through both ways the bot parses a log
+    fired = []
+    getattr(logparsing, method)(log, fired=fired)
+    assert [rule for rule in fire if rule not in fired] == []
+    assert [rule for rule in quiet if rule in fired] == []
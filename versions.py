@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import re
+from bisect import bisect_right
+from functools import lru_cache
+
+# The parts of PEP 440 that mod and loader versions use, ordered the way packaging orders them
+VERSION_PATTERN = re.compile(r'''
+    v?(?:(\d+)!)?                                        # epoch
+    (\d+(?:\.\d+)*)                                      # release
+    (?:[-_.]?(a|alpha|b|beta|c|rc|pre|preview)[-_.]?(\d*))?  # pre-release
+    (?:-(\d+)|[-_.]?(?:post|rev|r)[-_.]?(\d*))?          # post-release
+    (?:[-_.]?dev[-_.]?(\d*))?                            # development release
+    (?:\+([a-z0-9]+(?:[-_.][a-z0-9]+)*))?                # local version
+''', re.VERBOSE | re.IGNORECASE)
+PRE_RELEASES = {'a': 0, 'alpha': 0, 'b': 1, 'beta': 1, 'c': 2, 'rc': 2, 'pre': 2, 'preview': 2}
+
+@lru_cache(maxsize=1024)
+def parse_version(text):
+    # a tuple that sorts like packaging.version.Version, ValueError if it isn't a version
+    match = VERSION_PATTERN.fullmatch(text.strip())
+    if match is None:
+        raise ValueError(f'Invalid version: {text!r}')
+    epoch, release, pre, pre_number, post_dash, post_number, dev, local = match.groups()
+    release = tuple(int(part) for part in release.split('.'))
+    # 1.0 and 1.0.0 are the same version
+    while len(release) > 1 and release[-1] == 0:
+        release = release[:-1]
+    post = post_dash if post_dash is not None else post_number
+    if pre is not None:
+        pre_key = (0, PRE_RELEASES[pre.lower()], int(pre_number or 0))
+    elif post is None and dev is not None:
+        pre_key = (-1,) # 1.0.dev0 comes before 1.0a0
+    else:
+        pre_key = (1,)
+    post_key = (-1,) if post is None else (0, int(post or 0))
+    dev_key = (1,) if dev is None else (0, int(dev or 0))
+    local_key = () if local is None else tuple((1, int(part), '') if part.isdigit() else (0, 0, part.lower())
+                                              for part in re.split(r'[-_.]', local))
+    return int(epoch or 0), release, pre_key, post_key, dev_key, local_key
+
+class VersionRanges:
+    # Looks up which range a version falls in with one bisect. `ranges` are (lowest version,
+    # value) pairs in ascending order, each reaching up to the next one; versions below
+    # the first get `default`.
+    def __init__(self, ranges, default=None):
+        self.bounds = [parse_version(lowest) for lowest, _ in ranges]
+        self.values = [default] + [value for _, value in ranges]
+        if self.bounds != sorted(self.bounds):
+            raise ValueError('version ranges must be in ascending order')
+
+    def __getitem__(self, version):
+        return self.values[bisect_right(self.bounds, parse_version(version))]